@@ -8,6 +8,9 @@ from app.config import get_settings
 # import ALL models so Alembic sees them
 from app.model.user import User
 from app.model.subscription import Subscription
+from app.model.usage import Usage, UsageReservation
+from app.model.generation import Generation
+from app.model.outbox import OutboxEvent
 
 config = context.config
 
@@ -0,0 +1,113 @@
+"""hot_path_indexes
+
+Revision ID: 5e2b8c41d9f7
+Revises: 3c1f9a7d52e4
+Create Date: 2026-10-19 11:03:27.550913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b8c41d9f7'
+down_revision: Union[str, Sequence[str], None] = '3c1f9a7d52e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Indexes are built CONCURRENTLY (no write lock on live tables), which
+# Postgres only allows outside a transaction → autocommit_block. If a
+# concurrent build fails it leaves an INVALID index behind; drop it and
+# rerun the upgrade (if_not_exists would otherwise skip it).
+
+ACTIVE_SUBSCRIPTION = sa.text("status IN ('active', 'trialing')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Merge duplicate usage rows for the same period into the oldest one,
+    # so the unique index can be built.
+    op.execute(
+        """
+        WITH ranked AS (
+            SELECT id,
+                   first_value(id) OVER w AS keep_id,
+                   sum(coalesce(optimizations_used, 0)) OVER w AS total
+            FROM usage
+            WINDOW w AS (
+                PARTITION BY user_id, period_start, period_end
+                ORDER BY id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+            )
+        ),
+        merged AS (
+            UPDATE usage u
+            SET optimizations_used = r.total
+            FROM ranked r
+            WHERE u.id = r.id AND r.id = r.keep_id
+        )
+        DELETE FROM usage u
+        USING ranked r
+        WHERE u.id = r.id AND r.id <> r.keep_id
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        # usage: one row per (user, billing period); lookups and the
+        # metering upsert use the same key
+        op.create_index(
+            'uq_usage_user_period',
+            'usage',
+            ['user_id', 'period_start', 'period_end'],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+        # subscriptions: active plan resolution (active/trialing only,
+        # filtered on current_period_end)
+        op.create_index(
+            'ix_subscriptions_active',
+            'subscriptions',
+            ['user_id', 'current_period_end'],
+            postgresql_where=ACTIVE_SUBSCRIPTION,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+        # subscriptions: latest by status for /subscription/me
+        op.create_index(
+            'ix_subscriptions_user_status_created',
+            'subscriptions',
+            ['user_id', 'status', 'created_at'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    # Promote the unique index to a constraint (instant, reuses the index)
+    op.execute(
+        "ALTER TABLE usage ADD CONSTRAINT uq_usage_user_period "
+        "UNIQUE USING INDEX uq_usage_user_period"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_usage_user_period', 'usage', type_='unique')
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_subscriptions_user_status_created',
+            table_name='subscriptions',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            'ix_subscriptions_active',
+            table_name='subscriptions',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
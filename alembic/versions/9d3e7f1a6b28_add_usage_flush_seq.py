@@ -0,0 +1,32 @@
+"""add_usage_flush_seq
+
+Revision ID: 9d3e7f1a6b28
+Revises: 5e2b8c41d9f7
+Create Date: 2026-10-19 13:26:51.084467
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3e7f1a6b28'
+down_revision: Union[str, Sequence[str], None] = '5e2b8c41d9f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Constant default → no table rewrite on Postgres 11+
+    op.add_column(
+        'usage',
+        sa.Column('flush_seq', sa.BigInteger(), server_default='0', nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('usage', 'flush_seq')
@@ -0,0 +1,50 @@
+"""add_usage_reservations
+
+Revision ID: b47c2e9f0a13
+Revises: 9d3e7f1a6b28
+Create Date: 2026-10-19 15:02:10.772301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b47c2e9f0a13'
+down_revision: Union[str, Sequence[str], None] = '9d3e7f1a6b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'usage',
+        sa.Column('optimizations_reserved', sa.Integer(), server_default='0', nullable=False),
+    )
+    op.create_table(
+        'usage_reservations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('usage_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['usage_id'], ['usage.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        op.f('ix_usage_reservations_expires_at'),
+        'usage_reservations',
+        ['expires_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_usage_reservations_expires_at'), table_name='usage_reservations')
+    op.drop_table('usage_reservations')
+    op.drop_column('usage', 'optimizations_reserved')
@@ -0,0 +1,47 @@
+"""add_generations
+
+Revision ID: c8f1d2a7e5b9
+Revises: b47c2e9f0a13
+Create Date: 2026-10-19 16:40:05.219871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f1d2a7e5b9'
+down_revision: Union[str, Sequence[str], None] = 'b47c2e9f0a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'generations',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('product_info', sa.String(length=512), nullable=False),
+        sa.Column('result', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_generations_user_created_id',
+        'generations',
+        ['user_id', 'created_at', 'id'],
+        unique=False,
+    )
+    # Already compressed by the app; skip TOAST's own pglz pass
+    op.execute("ALTER TABLE generations ALTER COLUMN result SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_generations_user_created_id', table_name='generations')
+    op.drop_table('generations')
@@ -0,0 +1,50 @@
+"""drop_subscriptions_active_index
+
+Revision ID: e3a7c9d1f4b6
+Revises: c8f1d2a7e5b9
+Create Date: 2026-10-19 18:12:44.308157
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7c9d1f4b6'
+down_revision: Union[str, Sequence[str], None] = 'c8f1d2a7e5b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# No query filters subscriptions on current_period_end: plans resolve
+# from the principal's selectin-loaded subscriptions (WHERE user_id IN),
+# which ix_subscriptions_user_status_created already serves. The partial
+# index only cost writes.
+
+ACTIVE_SUBSCRIPTION = sa.text("status IN ('active', 'trialing')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_subscriptions_active',
+            table_name='subscriptions',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_subscriptions_active',
+            'subscriptions',
+            ['user_id', 'current_period_end'],
+            postgresql_where=ACTIVE_SUBSCRIPTION,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
@@ -1,8 +1,12 @@
 import stripe
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from app.config import get_settings
 from app.auth.deps import get_current_user
-from app.model.user import User
+from app.auth.principal_cache import invalidate_principal
+from app.db_routing import note_user_write
+from app.schemas.user import AuthenticatedUser
+from app.services.stripe_customer_service import ensure_stripe_customer
 
 settings = get_settings()
 stripe.api_key = settings.stripe_secret_key
@@ -11,12 +15,22 @@ router = APIRouter(prefix="/billing", tags=["Billing"])
 
 
 @router.post("/checkout")
-def create_checkout_session(
-    current_user: User = Depends(get_current_user),
+async def create_checkout_session(
+    current_user: AuthenticatedUser = Depends(get_current_user),
 ):
-    session = stripe.checkout.Session.create(
+    # Customer may still be queued in the outbox → create it now
+    customer_id = current_user.stripe_customer_id
+    if customer_id is None:
+        customer_id = await run_in_threadpool(
+            ensure_stripe_customer, current_user.id
+        )
+        await note_user_write(current_user.id)
+        await invalidate_principal(current_user.id)
+
+    session = await run_in_threadpool(
+        stripe.checkout.Session.create,
         mode="subscription",
-        customer=current_user.stripe_customer_id,
+        customer=customer_id,
         line_items=[
             {
                 "price": "price_starter_monthly",  # or Growth
@@ -30,4 +44,4 @@ def create_checkout_session(
         },
     )
 
-    return {"url": session.url}
\ No newline at end of file
+    return {"url": session.url}
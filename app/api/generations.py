@@ -0,0 +1,58 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.deps import get_current_user, get_user_read_db
+from app.config import get_settings
+from app.schemas.user import AuthenticatedUser
+from app.services.generation_service import (
+    decode_cursor,
+    get_generation,
+    list_generations,
+)
+
+settings = get_settings()
+
+router = APIRouter(prefix="/generations", tags=["Generations"])
+
+
+@router.get("")
+async def list_my_generations(
+    limit: int = Query(
+        settings.generation_page_size, ge=1, le=settings.generation_max_page_size
+    ),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_user_read_db),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    # 1️⃣ Resume after the previous page's last row
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # 2️⃣ One index range scan; results stay on disk
+    items, next_cursor = await list_generations(db, current_user.id, limit, after)
+
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/{generation_id}")
+async def get_my_generation(
+    generation_id: int,
+    db: AsyncSession = Depends(get_user_read_db),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    generation = await get_generation(db, current_user.id, generation_id)
+
+    # Someone else's generation looks the same as a missing one
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+
+    return generation
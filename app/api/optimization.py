@@ -1,54 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from app.db import get_db
-from app.auth.deps import get_current_user
-from app.model.user import User
-from app.services.subscription_service import (
-    get_active_subscriptions,
-    resolve_user_plan,
-)
-from app.services.usage_service import (
-    get_current_usage,
-    increment_usage,
-)
+import asyncio
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import JSONResponse
+
+from app.auth.deps import get_current_user, get_current_entitlement
+from app.auth.entitlements import Entitlement
+from app.chain import runPromptChain
+from app.concurrency import acquire_generation_slot, release_generation_slot
+from app.config import get_settings
+from app.models import ProductInfoRequest
+from app.schemas.user import AuthenticatedUser
+from app.services import quota_service
+from app.services.generation_service import save_generation
+from app.services.usage_service import usage_period
+
+settings = get_settings()
 
 router = APIRouter(prefix="/optimize", tags=["Optimization"])
 
 
 @router.post("")
-def run_optimization(
-    payload: dict,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+async def run_optimization(
+    request: ProductInfoRequest,
+    background_tasks: BackgroundTasks,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    # 1️⃣ Resolve plan + billing period (token entitlement; no subscriptions query)
+    entitlement: Entitlement = Depends(get_current_entitlement),
 ):
-    # 1️⃣ Resolve plan
-    subs = get_active_subscriptions(db, current_user.id)
-    plan = resolve_user_plan(subs)
+    plan = entitlement.plan
+    limit = plan["limits"]["optimizations"]
+    period_start, period_end = usage_period(
+        entitlement.period_start, entitlement.period_end
+    )
 
-    # 2️⃣ Check usage limits
-    usage = get_current_usage(db, current_user.id)
+    # 2️⃣ Reserve one unit of quota (atomic; 403 when exhausted)
+    reservation = await quota_service.reserve(
+        current_user.id, limit, period_start, period_end
+    )
 
-    if not plan["limits"]["unlimited"]:
-        if usage.optimizations_used >= plan["limits"]["optimizations"]:
+    slot = await acquire_generation_slot(str(current_user.id), plan)
+    if slot is None:
+        await quota_service.release(reservation)
+        return JSONResponse(
+            status_code=429,
+            content={"error": "Too many generations in progress"},
+        )
+
+    # 3️⃣ Run the chain — no DB connection held from here on
+    try:
+        result = await asyncio.wait_for(
+            runPromptChain(
+                user_id=str(current_user.id),
+                product_info=request.product_info,
+            ),
+            timeout=settings.optimization_timeout_seconds,
+        )
+    except asyncio.TimeoutError:
+        await quota_service.release(reservation)
+        raise HTTPException(status_code=504, detail="Optimization timed out")
+    except BaseException as e:
+        # Failure or client disconnect (cancel) → give the unit back
+        await quota_service.release(reservation)
+        if isinstance(e, Exception):
             raise HTTPException(
-                status_code=403,
-                detail="Monthly optimization limit reached",
+                status_code=500,
+                detail="AI generation failed. Please try again.",
             )
+        raise
+    finally:
+        await release_generation_slot(slot)
 
-    # 3️⃣ Run AI / business logic
-    # 🔥 this is where OpenAI / Gemini / Claude goes
-    result = {
-        "optimized_text": "AI optimized content here"
-    }
+    # 4️⃣ Count usage ONLY after success
+    used = await quota_service.commit(reservation)
 
-    # 4️⃣ Increment usage ONLY after success
-    increment_usage(db, current_user.id)
+    # 5️⃣ Keep it in the user's history (after the response is sent)
+    background_tasks.add_task(
+        save_generation, current_user.id, "optimize", request.product_info, result
+    )
 
     return {
         "result": result,
         "usage": {
-            "used": usage.optimizations_used + 1,
-            "limit": plan["limits"]["optimizations"],
+            "used": used,
+            "limit": limit,
         },
-    }
\ No newline at end of file
+    }
@@ -1,54 +1,143 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime
+import hashlib
+from typing import Optional, Tuple
 
-from app.db import get_db
-from app.model.user import User
+from fastapi import APIRouter, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db_routing import read_session
+from app.schemas.user import AuthenticatedUser
 from app.model.subscription import Subscription
+from app.model.usage import Usage
 from app.auth.deps import get_current_user
-from app.services.usage_service import get_usage_for_period
-from app.core.plans import PLANS_BY_PRICE_ID
+from app.services.usage_service import usage_period
+from app.usage_buffer import buffered_usage
+from app.subscription_cache import cache_subscription_me, get_cached_subscription_me
+from app.core.plans import FREE_PLAN, PLANS_BY_PRICE_ID
+
+settings = get_settings()
 
 router = APIRouter(prefix="/subscription", tags=["Subscription"])
 
-@router.get("/me")
-def get_my_subscription(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    # 1️⃣ Fetch latest active/trialing subscription
-    subscription = (
-        db.query(Subscription)
-        .filter(
-            Subscription.user_id == current_user.id,
+# The browser revalidates on every poll; unchanged → 304, no body
+CACHE_CONTROL = "private, no-cache"
+
+FREE_PLAN_RESPONSE = {
+    "id": "free",
+    "name": "Free",
+    "limits": {
+        "optimizations_per_period": FREE_PLAN["limits"]["optimizations"]
+    },
+}
+
+
+def _etag(*parts) -> str:
+    digest = hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+async def _current_used(user_id: int, stored, period_start, period_end) -> int:
+    """Stored count, unless unflushed Redis counts are newer."""
+    used = stored or 0
+    if settings.usage_buffer_enabled:
+        buffered = await buffered_usage(user_id, period_start, period_end)
+        if buffered is not None:
+            used = buffered
+    return used
+
+
+# Statements are built here so scripts/check_query_plans.py EXPLAINs
+# exactly what the endpoint sends
+def _subscription_query(user_id: int):
+    """Latest active/trialing subscription + its period's usage."""
+    return (
+        select(
+            Subscription.id,
+            Subscription.status,
+            Subscription.stripe_price_id,
+            Subscription.current_period_start,
+            Subscription.current_period_end,
+            Subscription.cancel_at_period_end,
+            Subscription.updated_at,
+            Usage.optimizations_used,
+            Usage.updated_at.label("usage_updated_at"),
+        )
+        .outerjoin(
+            Usage,
+            and_(
+                Usage.user_id == Subscription.user_id,
+                Usage.period_start == Subscription.current_period_start,
+                Usage.period_end == Subscription.current_period_end,
+            ),
+        )
+        .where(
+            Subscription.user_id == user_id,
             Subscription.status.in_(["active", "trialing", "past_due"]),
         )
         .order_by(Subscription.created_at.desc())
-        .first()
+        .limit(1)
     )
 
-    # 2️⃣ No subscription → FREE user
-    if not subscription:
-        return {
-            "has_subscription": False,
-            "status": "free",
-            "plan": {
-                "id": "free",
-                "name": "Free",
-                "limits": {
-                    "optimizations_per_period": 1
-                },
-            },
-            "billing": None,
-            "usage": {
-                "used": 0,
-                "remaining": 1,
-                "resets_at": None,
-            },
-        }
+
+def _free_usage_query(user_id: int, period_start, period_end):
+    return select(Usage.optimizations_used, Usage.updated_at).where(
+        Usage.user_id == user_id,
+        Usage.period_start == period_start,
+        Usage.period_end == period_end,
+    )
+
+
+async def _render_free(db: AsyncSession, user_id: int) -> Tuple[str, dict]:
+    """Free users are metered per calendar month (usage_period)."""
+    period_start, period_end = usage_period(None, None)
+    row = (
+        await db.execute(_free_usage_query(user_id, period_start, period_end))
+    ).first()
+
+    stored, usage_updated_at = row if row is not None else (None, None)
+    used = await _current_used(user_id, stored, period_start, period_end)
+    limit = FREE_PLAN_RESPONSE["limits"]["optimizations_per_period"]
+
+    body = jsonable_encoder({
+        "has_subscription": False,
+        "status": "free",
+        "plan": FREE_PLAN_RESPONSE,
+        "billing": None,
+        "usage": {
+            "used": used,
+            "remaining": max(limit - used, 0),
+            "resets_at": period_end,
+        },
+    })
+
+    etag = _etag("free", period_start.isoformat(), usage_updated_at, used)
+    return etag, body
+
+
+async def _render(db: AsyncSession, user_id: int) -> Tuple[str, dict]:
+    """(etag, body) for /subscription/me; one query for subscribers."""
+    # 1️⃣ Latest active/trialing subscription + its period's usage
+    row = (await db.execute(_subscription_query(user_id))).first()
+
+    # 2️⃣ No subscription → FREE user (calendar-month usage)
+    if row is None:
+        return await _render_free(db, user_id)
 
     # 3️⃣ Resolve internal plan from Stripe price
-    plan = PLANS_BY_PRICE_ID.get(subscription.stripe_price_id)
+    plan = PLANS_BY_PRICE_ID.get(row.stripe_price_id)
 
     if not plan:
         # Safety fallback — never break frontend
@@ -60,28 +149,53 @@ def get_my_subscription(
             },
         }
 
-    # 4️⃣ Usage tracking (billing-period scoped)
-    usage = get_usage_for_period(
-        db=db,
-        user_id=current_user.id,
-        period_start=subscription.current_period_start,
-        period_end=subscription.current_period_end,
+    # 4️⃣ Usage tracking (billing-period scoped; unflushed Redis counts win)
+    used = await _current_used(
+        user_id,
+        row.optimizations_used,
+        row.current_period_start,
+        row.current_period_end,
     )
 
-    used = usage.used
     limit = plan["limits"]["optimizations_per_period"]
 
-    return {
+    body = jsonable_encoder({
         "has_subscription": True,
-        "status": subscription.status,
+        "status": row.status,
         "plan": plan,
         "billing": {
-            "renews_at": subscription.current_period_end,
-            "cancel_at_period_end": subscription.cancel_at_period_end,
+            "renews_at": row.current_period_end,
+            "cancel_at_period_end": row.cancel_at_period_end,
         },
         "usage": {
             "used": used,
             "remaining": max(limit - used, 0),
-            "resets_at": subscription.current_period_end,
+            "resets_at": row.current_period_end,
         },
-    }
+    })
+
+    # `used` too: buffered increments don't touch usage.updated_at
+    etag = _etag(row.id, row.updated_at, row.usage_updated_at, used)
+    return etag, body
+
+
+@router.get("/me")
+async def get_my_subscription(
+    request: Request,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    # A cache hit needs no session, nor read_session's recent-write lookup
+    cached = await get_cached_subscription_me(current_user.id)
+    if cached is None:
+        async with await read_session(current_user.id) as db:
+            etag, body = await _render(db, current_user.id)
+        await cache_subscription_me(current_user.id, {"etag": etag, "body": body})
+    else:
+        etag, body = cached["etag"], cached["body"]
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(content=body, headers=headers)
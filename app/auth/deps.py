@@ -1,44 +1,133 @@
-from fastapi import Depends, HTTPException, status
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_async_db
+from app.db_routing import read_session
 from app.model.user import User
 from app.config import get_settings
+from app.schemas.user import AuthenticatedUser
+from app.auth.principal_cache import cache_principal, get_cached_principal
+from app.auth.entitlements import (
+    Entitlement,
+    entitlement_from_payload,
+    entitlement_from_user,
+)
 
 settings = get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+async def _load_principal(user_id: int) -> Optional[AuthenticatedUser]:
+    # Own short-lived session: the connection goes back to the pool
+    # before the handler runs. Replica unless the user just wrote.
+    async with await read_session(user_id) as db:
+        # subscriptions are selectin-loaded inside this await
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+        return AuthenticatedUser.model_validate(user)
+
+
+def get_token_payload(
+    token: str = Depends(oauth2_scheme),
+) -> dict:
+    """Verified JWT claims. Decoded once per request (FastAPI caches it)."""
     try:
         payload = jwt.decode(
             token,
             settings.jwt_secret,
             algorithms=[settings.jwt_algorithm],
         )
+    except JWTError:
+        raise _credentials_exception()
 
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+
+    return payload
+
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+) -> AuthenticatedUser:
+    """
+    Authenticated principal, served from the principal cache.
+    Only a cache miss touches the database.
+    """
+    try:
+        user_id = int(payload["sub"])
+    except ValueError:
+        raise _credentials_exception()
+
+    principal = await get_cached_principal(user_id)
+
+    if principal is None:
+        principal = await _load_principal(user_id)
+        if principal is None:
+            raise _credentials_exception()
+        await cache_principal(principal)
+
+    return principal
+
+
+async def get_user_read_db(
+    principal: AuthenticatedUser = Depends(get_current_user),
+) -> AsyncIterator[AsyncSession]:
+    """
+    Session for read-only endpoints: the read replica when it's in sync
+    and the user hasn't written recently, otherwise the primary.
+    """
+    async with await read_session(principal.id) as db:
+        yield db
+
+
+async def get_current_entitlement(
+    request: Request,
+    payload: dict = Depends(get_token_payload),
+    principal: AuthenticatedUser = Depends(get_current_user),
+) -> Entitlement:
+    """
+    Plan and billing period: from the token's entitlement claim while it
+    is valid, otherwise from the cached principal's subscriptions.
+    Rate-limited routes reuse the claim the middleware already checked.
+    """
+    entitlement = getattr(request.state, "entitlement", None)
+    if entitlement is not None:
+        return entitlement
+
+    entitlement = await entitlement_from_payload(payload)
+    if entitlement is not None:
+        return entitlement
+    return entitlement_from_user(principal)
+
+
+async def get_current_plan(
+    entitlement: Entitlement = Depends(get_current_entitlement),
+) -> dict:
+    return entitlement.plan
 
-    except JWTError:
-        raise credentials_exception
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+async def get_current_user_orm(
+    principal: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+) -> User:
+    """For handlers that need the ORM object itself (e.g. to modify it)."""
+    user = await db.get(User, principal.id)
 
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+from app.config import get_settings
+from app.services.subscription_service import resolve_plan_and_period
+from app.tiered_cache import TieredCache
+
+settings = get_settings()
+
+# ===============================
+# Entitlement claims
+# ===============================
+# Access tokens can carry a signed, short-lived snapshot of the user's
+# plan under the "ent" claim:
+#
+#   {"plan": "starter", "limits": {...},
+#    "period_start": <epoch|null>, "period_end": <epoch|null>,
+#    "iat": <epoch>, "exp": <epoch>}
+#
+# Hot paths trust it until "exp" (at most entitlement_ttl_seconds, never
+# past the billing period end), so they skip the subscriptions lookup.
+# When Stripe reports a plan change, the webhook records a per-user
+# revocation time; snapshots issued before it are ignored and the client
+# fetches a fresh token from /auth/refresh.
+
+ENTITLEMENT_CLAIM = "ent"
+
+
+class Entitlement(NamedTuple):
+    plan: dict
+    period_start: Optional[datetime]
+    period_end: Optional[datetime]
+    from_token: bool
+
+
+# user id -> epoch seconds; entitlements issued earlier are void.
+# Almost every user has none, so "not revoked" is cached in L1 too.
+_revocations = TieredCache(
+    namespace="entrev",
+    ttl=settings.entitlement_ttl_seconds,
+    l1_miss_ttl=settings.entitlement_revocation_miss_ttl_seconds,
+)
+
+
+def _to_epoch(dt: Optional[datetime]) -> Optional[float]:
+    return dt.timestamp() if dt is not None else None
+
+
+def _from_epoch(ts: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(ts, tz=timezone.utc) if ts is not None else None
+
+
+def build_entitlement_claim(user) -> dict:
+    """Snapshot for create_access_token(entitlement=...)."""
+    plan, period_start, period_end = resolve_plan_and_period(user)
+
+    now = time.time()
+    expires = now + settings.entitlement_ttl_seconds
+    if period_end is not None:
+        expires = min(expires, period_end.timestamp())
+
+    return {
+        "plan": plan["name"].lower(),
+        "name": plan["name"],
+        "limits": plan["limits"],
+        "period_start": _to_epoch(period_start),
+        "period_end": _to_epoch(period_end),
+        "iat": now,
+        "exp": expires,
+    }
+
+
+def entitlement_from_user(user) -> Entitlement:
+    """Slow path: resolve from the (cached) principal's subscriptions."""
+    plan, period_start, period_end = resolve_plan_and_period(user)
+    return Entitlement(plan, period_start, period_end, from_token=False)
+
+
+async def entitlement_from_payload(payload: dict) -> Optional[Entitlement]:
+    """The token's snapshot, or None if missing, expired or revoked."""
+    claim = payload.get(ENTITLEMENT_CLAIM)
+    if not claim:
+        return None
+
+    if claim["exp"] <= time.time():
+        return None
+
+    revoked_before = await _revocations.get(str(payload["sub"]))
+    if revoked_before is not None and claim["iat"] < revoked_before:
+        return None
+
+    return Entitlement(
+        plan={"name": claim["name"], "limits": claim["limits"]},
+        period_start=_from_epoch(claim["period_start"]),
+        period_end=_from_epoch(claim["period_end"]),
+        from_token=True,
+    )
+
+
+async def revoke_entitlements(user_id: int) -> None:
+    """Void every entitlement snapshot issued to the user so far."""
+    await _revocations.set(str(user_id), time.time())
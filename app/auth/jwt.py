@@ -1,38 +1,43 @@
+import uuid
 from datetime import datetime, timedelta
 from jose import jwt
-from passlib.context import CryptContext
 
 from app.config import get_settings
-
-settings = get_settings()
-
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto"
+from app.auth.entitlements import ENTITLEMENT_CLAIM
+from app.auth.passwords import (  # noqa: F401  (re-exported)
+    hash_password,
+    verify_password,
 )
 
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+settings = get_settings()
 
 
 def create_access_token(
     data: dict,
-    expires_delta: timedelta | None = None
+    expires_delta: timedelta | None = None,
+    entitlement: dict | None = None,
+    expires_at: datetime | None = None,
 ):
+    """
+    entitlement: optional plan snapshot (app/auth/entitlements.py),
+    embedded as the "ent" claim.
+    expires_at: fixed expiry (naive UTC), overriding expires_delta; used
+    by /auth/refresh so a refreshed token never outlives the original.
+    """
     to_encode = data.copy()
 
-    expire = datetime.utcnow() + (
+    if entitlement is not None:
+        to_encode[ENTITLEMENT_CLAIM] = entitlement
+
+    now = datetime.utcnow()
+    expire = expires_at or now + (
         expires_delta
         if expires_delta
         else timedelta(minutes=settings.access_token_expire_minutes)
     )
 
-    to_encode.update({"exp": expire})
+    # iat/jti identify the token itself (cache keys, revocation)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
 
     return jwt.encode(
         to_encode,
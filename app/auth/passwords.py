@@ -1,9 +1,138 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.config import get_settings
+
+settings = get_settings()
+
+# ===============================
+# Password hashing
+# ===============================
+# bcrypt is deliberately CPU-heavy. Running it in FastAPI's shared
+# threadpool lets a login storm starve every sync endpoint, so the async
+# helpers below run it on a small dedicated process pool, with a bound on
+# queued work and a timeout. password_hash_executor = "thread" puts it
+# back on the shared threadpool (same bound and timeout), for comparison
+# with scripts/bench_login_storm.py.
+#
+# The cost factor is `settings.bcrypt_rounds`. Hashes with any other
+# cost verify normally and are flagged for rehash, so changing the
+# setting upgrades (or downgrades) users transparently on their next login.
+
+_contexts: Dict[int, CryptContext] = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    # Built per process (pool workers don't share module state)
+    ctx = _contexts.get(rounds)
+    if ctx is None:
+        ctx = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        _contexts[rounds] = ctx
+    return ctx
+
+
+pwd_context = _context(settings.bcrypt_rounds)
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
+
 def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
\ No newline at end of file
+    return pwd_context.verify(password, hashed)
+
+
+# -------------------------
+# Process pool workers (must be module-level to pickle)
+# -------------------------
+def _hash_in_worker(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_in_worker(
+    password: str, hashed: str, rounds: int
+) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHasherBusy(Exception):
+    """Too much hashing work queued, or it took longer than the timeout."""
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _mp_context():
+    # Never fork: the pool starts lazily inside a worker that already runs
+    # threads (threadpool, Redis/DB drivers), and a forked child can inherit
+    # a lock held by one of them and deadlock. forkserver forks from a clean
+    # single-threaded server; spawn where it isn't available.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            mp_context=_mp_context(),
+        )
+    return _pool
+
+
+def shutdown_password_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run(fn, *args):
+    global _pending
+
+    if _pending >= settings.password_hash_max_pending:
+        raise PasswordHasherBusy("Password hashing queue is full")
+
+    _pending += 1
+    try:
+        if settings.password_hash_executor == "thread":
+            work = run_in_threadpool(fn, *args)
+        else:
+            loop = asyncio.get_running_loop()
+            work = loop.run_in_executor(_get_pool(), fn, *args)
+        return await asyncio.wait_for(
+            work, timeout=settings.password_hash_timeout_seconds
+        )
+    except asyncio.TimeoutError:
+        raise PasswordHasherBusy("Password hashing timed out")
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(_hash_in_worker, password, settings.bcrypt_rounds)
+
+
+async def verify_password_async(
+    password: str, hashed: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Returns (is_valid, new_hash). new_hash is set when the stored hash
+    uses a different cost factor and should be replaced.
+    """
+    return await _run(_verify_in_worker, password, hashed, settings.bcrypt_rounds)
@@ -0,0 +1,28 @@
+from typing import Optional
+
+from app.config import get_settings
+from app.schemas.user import AuthenticatedUser
+from app.tiered_cache import TieredCache
+
+settings = get_settings()
+
+# Authenticated principal per user id. Short TTL; invalidated whenever
+# the user row or their subscriptions change (including the webhook).
+principal_cache = TieredCache(
+    namespace="principal",
+    ttl=settings.principal_cache_ttl_seconds,
+    l1_ttl=min(settings.l1_cache_ttl_seconds, settings.principal_cache_ttl_seconds),
+)
+
+
+async def get_cached_principal(user_id: int) -> Optional[AuthenticatedUser]:
+    data = await principal_cache.get(str(user_id))
+    return AuthenticatedUser.model_validate(data) if data is not None else None
+
+
+async def cache_principal(principal: AuthenticatedUser) -> None:
+    await principal_cache.set(str(principal.id), principal.model_dump(mode="json"))
+
+
+async def invalidate_principal(user_id: int) -> None:
+    await principal_cache.invalidate(str(user_id))
@@ -1,63 +1,73 @@
-from datetime import timedelta
-import stripe
+from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_async_db
+from app.db_routing import note_user_write
 from app.model.user import User
-from app.schemas.user import UserCreate
-from app.auth.jwt import (
-    hash_password,
-    verify_password,
-    create_access_token,
+from app.schemas.user import AuthenticatedUser, UserCreate
+from app.auth.deps import get_current_user, get_token_payload
+from app.auth.entitlements import build_entitlement_claim
+from app.auth.jwt import create_access_token
+from app.auth.passwords import (
+    PasswordHasherBusy,
+    hash_password_async,
+    verify_password_async,
 )
+from app.services.stripe_customer_service import enqueue_customer_creation
 from app.config import get_settings
 
 settings = get_settings()
-stripe.api_key = settings.stripe_secret_key
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 # ====================
 # Register (JSON)
 # ====================
+# bcrypt is awaited on the password process pool, DB calls on the async
+# session. The Stripe customer is created later by the outbox worker.
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-def register(
+async def register(
     user: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # 1️⃣ Check existing user
-    if db.query(User).filter(User.email == user.email).first():
+    existing = await db.scalar(select(User.id).where(User.email == user.email))
+    if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already exists",
         )
 
-    # 2️⃣ Create Stripe customer safely
-    stripe_customer_id = None
+    # 2️⃣ Hash password
     try:
-        customer = stripe.Customer.create(
-            email=user.email,
-            metadata={"source": "auth_register"},
-        )
-        stripe_customer_id = customer.id
-    except Exception as e:
-        # IMPORTANT: Stripe must NOT block signup
-        print("Stripe customer creation failed:", str(e))
+        hashed_password = await hash_password_async(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
-    # 3️⃣ Create user
+    # 3️⃣ Create user + Stripe customer outbox event (one commit)
     new_user = User(
         email=user.email,
-        hashed_password=hash_password(user.password),
-        stripe_customer_id=stripe_customer_id,
+        hashed_password=hashed_password,
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
+    enqueue_customer_creation(db, new_user)
+    await db.commit()
+    await note_user_write(new_user.id)
 
     return {"message": "User created successfully"}
 
@@ -66,32 +76,66 @@ def register(
 # Login (OAuth2 Password Flow)
 # ====================
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # OAuth2 uses "username" → treat as email
-    user = db.query(User).filter(
-        User.email == form_data.username
-    ).first()
-
-    if not user or not verify_password(
-        form_data.password,
-        user.hashed_password,
-    ):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await verify_password_async(
+                form_data.password,
+                user.hashed_password,
+            )
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
         )
 
+    # Cost factor changed since this hash was made → store the new one
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    return _issue_token(user)
+
+
+# ====================
+# Refresh (new entitlement snapshot, same expiry)
+# ====================
+# Clients call this after a plan change, or when the entitlement in
+# their token has expired or been revoked. Only the "ent" claim is
+# re-signed: the new token keeps the original "exp", so refreshing
+# can't extend a session — that still takes a login.
+@router.post("/refresh", status_code=status.HTTP_200_OK)
+async def refresh(
+    payload: dict = Depends(get_token_payload),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    return _issue_token(
+        current_user,
+        expires_at=datetime.utcfromtimestamp(payload["exp"]),
+    )
+
+
+def _issue_token(user, expires_at: datetime | None = None) -> dict:
     access_token = create_access_token(
         data={"sub": str(user.id)},
         expires_delta=timedelta(
             minutes=settings.access_token_expire_minutes
         ),
+        entitlement=build_entitlement_claim(user),
+        expires_at=expires_at,
     )
 
     return {
         "access_token": access_token,
         "token_type": "bearer",
-    }
\ No newline at end of file
+    }
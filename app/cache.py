@@ -1,66 +1,56 @@
-import json
-from typing import Optional
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
 from app.config import get_settings
+from app.tiered_cache import TieredCache
 
 settings = get_settings()
 
-USE_REDIS = False
-redis_client = None
-
-_memory_cache: dict[str, str] = {}
-
-# ===============================
-# Redis Initialization
-# ===============================
-if settings.enable_redis:
-    try:
-        import redis  # lazy import
-
-        redis_client = redis.from_url(
-            settings.redis_url,
-            decode_responses=True,
-            socket_connect_timeout=2,
-            socket_timeout=2,
-        )
-        redis_client.ping()
-        USE_REDIS = True
-        print("✅ Redis cache enabled")
-
-    except Exception as e:
-        USE_REDIS = False
-        redis_client = None
-        print(f"⚠️ Redis cache unavailable, using memory cache ({e})")
+# L1 (in-process) in front of L2 (Redis); see app/tiered_cache.py.
+# Between the soft and hard TTL an analysis is served stale and
+# refreshed in the background.
+prompt1_cache = TieredCache(
+    namespace="prompt1",
+    ttl=settings.prompt1_hard_ttl_seconds,
+    soft_ttl=settings.prompt1_soft_ttl_seconds,
+)
 
 
 def _make_key(user_id: str, product_url: str) -> str:
-    return f"prompt1:{user_id}:{product_url}"
+    # Hash the product text so raw page dumps never become key bytes
+    digest = hashlib.sha256(product_url.encode("utf-8")).hexdigest()
+    return f"{user_id}:{digest}"
 
 
-def cache_prompt1_output(user_id: str, product_url: str, output: dict) -> None:
-    cache_key = _make_key(user_id, product_url)
-    cache_data = json.dumps(output)
+def _compact(output: Dict[str, Any]) -> Dict[str, Any]:
+    # product_info is the lookup input itself, so don't store it twice
+    return {k: v for k, v in output.items() if k != "product_info"}
 
-    if USE_REDIS and redis_client:
-        try:
-            redis_client.setex(cache_key, 86400, cache_data)  # 24h TTL
-        except Exception:
-            # fail silently → fallback
-            _memory_cache[cache_key] = cache_data
-    else:
-        _memory_cache[cache_key] = cache_data
 
+async def cache_prompt1_output(user_id: str, product_url: str, output: dict) -> None:
+    await prompt1_cache.set(_make_key(user_id, product_url), _compact(output))
 
-def get_cached_prompt1_output(
+
+async def get_cached_prompt1_output(
     user_id: str, product_url: str
 ) -> Optional[dict]:
-    cache_key = _make_key(user_id, product_url)
-
-    if USE_REDIS and redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-        except Exception:
-            cached_data = _memory_cache.get(cache_key)
-    else:
-        cached_data = _memory_cache.get(cache_key)
-
-    return json.loads(cached_data) if cached_data else None
\ No newline at end of file
+    cached = await prompt1_cache.get(_make_key(user_id, product_url))
+    if cached is None:
+        return None
+    return {**cached, "product_info": product_url}
+
+
+async def get_or_compute_prompt1_output(
+    user_id: str,
+    product_url: str,
+    compute: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """
+    Cached prompt 1 output, computing it on a miss.
+    Soft-expired entries are returned as-is and refreshed in the background.
+    """
+
+    async def load() -> Dict[str, Any]:
+        return _compact(await compute())
+
+    cached = await prompt1_cache.get_or_load(_make_key(user_id, product_url), load)
+    return {**cached, "product_info": product_url}
@@ -0,0 +1,169 @@
+import json
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# ===============================
+# Cache payload codecs
+# ===============================
+# Every encoded payload starts with a 3-byte header:
+#
+#   [version][serializer id][compressor id]
+#
+# so any codec can decode what any other codec wrote, and we can change
+# the configured codec without flushing Redis. Payloads without a header
+# (pre-codec plain JSON) are still readable.
+
+CODEC_VERSION = 1
+
+_HEADER_LEN = 3
+
+
+# -------------------------
+# Optional dependencies
+# -------------------------
+try:
+    import orjson  # optional
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # optional
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard  # optional
+except ImportError:
+    zstandard = None
+
+
+# -------------------------
+# Serializers: id -> (dumps, loads)
+# -------------------------
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return json.loads(data)
+
+
+SERIALIZERS: Dict[str, Tuple[int, Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (1, _json_dumps, _json_loads),
+}
+
+if orjson is not None:
+    SERIALIZERS["orjson"] = (2, orjson.dumps, orjson.loads)
+
+if msgpack is not None:
+    SERIALIZERS["msgpack"] = (
+        3,
+        lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False),
+    )
+
+# orjson output is plain JSON, so id 2 can always be read by json
+_SERIALIZER_LOADS: Dict[int, Callable[[bytes], Any]] = {
+    1: _json_loads,
+    2: orjson.loads if orjson is not None else _json_loads,
+}
+if msgpack is not None:
+    _SERIALIZER_LOADS[3] = SERIALIZERS["msgpack"][2]
+
+
+# -------------------------
+# Compressors: id -> (compress, decompress)
+# -------------------------
+COMPRESSORS: Dict[str, Tuple[int, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (0, lambda b: b, lambda b: b),
+    "zlib": (1, lambda b: zlib.compress(b, 6), zlib.decompress),
+}
+
+if zstandard is not None:
+    _zstd_c = zstandard.ZstdCompressor(level=3)
+    _zstd_d = zstandard.ZstdDecompressor()
+    COMPRESSORS["zstd"] = (2, _zstd_c.compress, _zstd_d.decompress)
+
+_DECOMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {
+    cid: decompress for cid, _, decompress in COMPRESSORS.values()
+}
+
+
+class CodecError(Exception):
+    pass
+
+
+class Codec:
+    """
+    Serializer + optional compression above `compress_min_bytes`.
+
+    Unavailable choices (optional package not installed) degrade to
+    json / zlib instead of failing at import time.
+    """
+
+    def __init__(
+        self,
+        serializer: str = "json",
+        compression: str = "none",
+        compress_min_bytes: int = 1024,
+    ):
+        if serializer not in SERIALIZERS:
+            serializer = "json"
+        if compression not in COMPRESSORS:
+            compression = "zlib" if compression != "none" else "none"
+
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+
+        self._ser_id, self._dumps, _ = SERIALIZERS[serializer]
+        self._comp_id, self._compress, _ = COMPRESSORS[compression]
+
+    @property
+    def name(self) -> str:
+        return f"{self.serializer}+{self.compression}"
+
+    def encode(self, obj: Any) -> bytes:
+        body = self._dumps(obj)
+        comp_id = 0
+
+        if self._comp_id and len(body) >= self.compress_min_bytes:
+            compressed = self._compress(body)
+            if len(compressed) < len(body):
+                body = compressed
+                comp_id = self._comp_id
+
+        return bytes((CODEC_VERSION, self._ser_id, comp_id)) + body
+
+    def decode(self, data: bytes | str) -> Any:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        # Legacy: plain JSON written before the codec layer existed
+        if not data or data[0] != CODEC_VERSION:
+            return json.loads(data)
+
+        ser_id, comp_id = data[1], data[2]
+        body = data[_HEADER_LEN:]
+
+        try:
+            decompress = _DECOMPRESSORS[comp_id]
+            loads = _SERIALIZER_LOADS[ser_id]
+        except KeyError:
+            raise CodecError(
+                f"Unsupported cache payload (serializer={ser_id}, compression={comp_id})"
+            )
+
+        return loads(decompress(body))
+
+
+def default_codec() -> Codec:
+    return Codec(
+        serializer=settings.cache_serializer,
+        compression=settings.cache_compression,
+        compress_min_bytes=settings.cache_compress_min_bytes,
+    )
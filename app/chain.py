@@ -1,6 +1,6 @@
 from typing import Dict, Any, Optional, List, TypedDict
 from app.config import get_settings
-from app.cache import cache_prompt1_output, get_cached_prompt1_output
+from app.cache import get_or_compute_prompt1_output
 from app.ai.openrouter_client import generate_text_with_fallback
 import re
 
@@ -191,10 +191,11 @@ Audit:
     try:
         p1_data = None
         if run_prompt1:
-            cached = get_cached_prompt1_output(user_id, product_info)
-            p1_data = cached or await prompt1(product_info)
-            if not cached:
-                cache_prompt1_output(user_id, product_info, p1_data)
+            p1_data = await get_or_compute_prompt1_output(
+                user_id,
+                product_info,
+                lambda: prompt1(product_info),
+            )
 
         p2_data = None
         if run_prompt2 and p1_data:
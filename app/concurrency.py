@@ -0,0 +1,142 @@
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional
+
+from app.config import get_settings
+from app.redis_client import get_redis, report_redis_error
+
+settings = get_settings()
+
+
+# ===============================
+# In-flight generation slots
+# ===============================
+# Caps concurrent generations per user and per plan tier. Slots are
+# leased with an expiry so a crashed worker can't leak them forever;
+# callers release them in a `finally` (completion, error or cancel).
+
+
+class GenerationSlot(NamedTuple):
+    user_id: str
+    tier: str
+    token: str
+    in_redis: bool
+
+
+# KEYS[1] = user slots zset, KEYS[2] = tier slots zset
+# ARGV    = now_ms, lease_ms, user_max, tier_max, token
+# Returns 1 if acquired, 0 if the user cap is hit, -1 if the tier cap is hit
+ACQUIRE_SLOT_LUA = """
+local now = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], 0, now)
+
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+    return -1
+end
+
+redis.call('ZADD', KEYS[1], now + lease, ARGV[5])
+redis.call('ZADD', KEYS[2], now + lease, ARGV[5])
+redis.call('PEXPIRE', KEYS[1], lease)
+redis.call('PEXPIRE', KEYS[2], lease)
+return 1
+"""
+
+_script = None
+_script_client = None
+
+# In-memory fallback: key -> {token: lease_expires_at}
+_memory_slots: Dict[str, Dict[str, float]] = {}
+
+
+def _acquire_script(redis):
+    global _script, _script_client
+
+    if _script is None or _script_client is not redis:
+        _script = redis.register_script(ACQUIRE_SLOT_LUA)
+        _script_client = redis
+    return _script
+
+
+def _user_key(user_id: str) -> str:
+    return f"inflight:user:{user_id}"
+
+
+def _tier_key(tier: str) -> str:
+    return f"inflight:tier:{tier}"
+
+
+def _memory_live(key: str, now: float) -> Dict[str, float]:
+    slots = _memory_slots.setdefault(key, {})
+    for token in [t for t, expires in slots.items() if expires <= now]:
+        del slots[token]
+    return slots
+
+
+async def acquire_generation_slot(
+    user_id: str,
+    plan: dict,
+) -> Optional[GenerationSlot]:
+    """
+    Reserve one in-flight generation for the user under their plan's
+    per-user and per-tier caps. Returns None when either cap is reached.
+    """
+    limits = plan["limits"]
+    user_max = limits["max_concurrent_generations"]
+    tier_max = limits["tier_concurrent_generations"]
+    tier = plan["name"].lower()
+    token = uuid.uuid4().hex
+    lease_seconds = settings.generation_slot_lease_seconds
+
+    redis = get_redis()
+    if redis is not None:
+        try:
+            now_ms = int(time.time() * 1000)
+            acquired = await _acquire_script(redis)(
+                keys=[_user_key(user_id), _tier_key(tier)],
+                args=[now_ms, lease_seconds * 1000, user_max, tier_max, token],
+            )
+            if int(acquired) != 1:
+                return None
+            return GenerationSlot(user_id, tier, token, in_redis=True)
+
+        except Exception as e:
+            report_redis_error(e)
+
+    now = time.monotonic()
+    user_slots = _memory_live(_user_key(user_id), now)
+    tier_slots = _memory_live(_tier_key(tier), now)
+
+    if len(user_slots) >= user_max or len(tier_slots) >= tier_max:
+        return None
+
+    user_slots[token] = now + lease_seconds
+    tier_slots[token] = now + lease_seconds
+    return GenerationSlot(user_id, tier, token, in_redis=False)
+
+
+async def release_generation_slot(slot: GenerationSlot) -> None:
+    if slot.in_redis:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.zrem(_user_key(slot.user_id), slot.token)
+                pipe.zrem(_tier_key(slot.tier), slot.token)
+                await pipe.execute()
+            except Exception as e:
+                # The lease expiry reclaims it
+                report_redis_error(e)
+        return
+
+    for key in (_user_key(slot.user_id), _tier_key(slot.tier)):
+        slots = _memory_slots.get(key)
+        if slots is not None:
+            slots.pop(slot.token, None)
+            if not slots:
+                del _memory_slots[key]
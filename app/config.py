@@ -6,9 +6,34 @@ class Settings(BaseSettings):
 
     database_url: str
 
+    # Read replica (optional; see app/db_routing.py)
+    database_replica_url: str | None = None
+    replica_max_lag_seconds: float = 5.0
+    replica_lag_check_seconds: float = 2.0
+    replica_read_your_writes_seconds: int = 10
+
+    # Database pool (per engine, per worker process; see app/db.py)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800  # -1 = never
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 30_000  # 0 = server default
+    db_pgbouncer: bool = False  # behind PgBouncer transaction pooling
+    db_checkout_warn_seconds: float = 5.0
+
     jwt_secret: str
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
+    entitlement_ttl_seconds: int = 900
+    entitlement_revocation_miss_ttl_seconds: int = 10  # "not revoked", per worker
+
+    # Password hashing (see app/auth/passwords.py)
+    bcrypt_rounds: int = 12
+    password_hash_executor: str = "process"  # process | thread (shared threadpool)
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+    password_hash_timeout_seconds: float = 5.0
 
     # AI
     openrouter_api_key: str
@@ -18,14 +43,72 @@ class Settings(BaseSettings):
     # Stripe
     stripe_secret_key: str | None = None
     stripe_webhook_secret: str | None = None
+    frontend_url: str = "http://localhost:3000"
+
+    # Stripe customer outbox (see app/services/stripe_customer_service.py)
+    stripe_outbox_poll_seconds: float = 2.0
+    stripe_outbox_batch_size: int = 20
+    stripe_outbox_max_attempts: int = 8
+    stripe_outbox_max_backoff_seconds: int = 600
+    stripe_outbox_lease_seconds: int = 120  # claimed events retry after this if the worker dies
 
     # Redis
     enable_redis: bool = True
     redis_url: str | None = None
+    redis_max_connections: int = 50
+    redis_pool_timeout_seconds: float = 2.0  # wait for a free pooled connection
+    redis_failure_threshold: int = 3
+    redis_probe_interval_seconds: float = 5.0
+    redis_probe_timeout_seconds: float = 0.5
+    redis_probe_min_backoff_seconds: float = 0.5
+    redis_probe_max_backoff_seconds: float = 30.0
+
+    # In-memory cache (L1 in front of Redis, sole tier when Redis is off)
+    memory_cache_max_entries: int = 1024
+    memory_cache_max_bytes: int = 64 * 1024 * 1024
+    l1_cache_ttl_seconds: int = 60
+
+    # Cache payload encoding (see app/cache_codecs.py)
+    cache_serializer: str = "orjson"  # json | orjson | msgpack
+    cache_compression: str = "zstd"  # none | zlib | zstd
+    cache_compress_min_bytes: int = 1024
+
+    # Generation history (see app/services/generation_service.py)
+    generation_compression: str = "zstd"  # none | zlib | zstd
+    generation_page_size: int = 20
+    generation_max_page_size: int = 100
+
+    # Prompt 1 analysis cache (stale-while-revalidate)
+    prompt1_soft_ttl_seconds: int = 20 * 3600
+    prompt1_hard_ttl_seconds: int = 24 * 3600
+    cache_refresh_lock_seconds: int = 120
 
     # Rate limiting
     rate_limit_per_user: int = 10
     rate_limit_window_seconds: int = 3600
+    rate_limit_memory_max_keys: int = 100_000
+    rate_limit_memory_sweep_seconds: int = 60
+    generation_slot_lease_seconds: int = 300
+
+    # Optimization quota reservations (see app/services/quota_service.py)
+    optimization_timeout_seconds: float = 300.0
+    quota_reservation_ttl_seconds: int = 600  # > optimization timeout
+    quota_reaper_interval_seconds: float = 30.0
+
+    # Redis-buffered usage metering (see app/usage_buffer.py)
+    usage_buffer_enabled: bool = False
+    usage_flush_interval_seconds: float = 5.0
+    usage_flush_batch_size: int = 500
+    usage_buffer_key_ttl_seconds: int = 40 * 24 * 3600
+
+    # Local rate-limit leasing for hot keys (see app/rate_limiter.py)
+    rate_limit_lease_enabled: bool = False
+    rate_limit_lease_size: int = 5
+    rate_limit_lease_ttl_seconds: float = 2.0
+    rate_limit_lease_min_limit: int = 100
+    plan_cache_ttl_seconds: int = 3600
+    principal_cache_ttl_seconds: int = 120
+    subscription_me_cache_ttl_seconds: int = 0  # /subscription/me responses; 0 = off
 
     class Config:
         env_file = ".env"
@@ -5,6 +5,10 @@ FREE_PLAN = {
         "csv_export": False,
         "cro_audit": False,
         "ad_hooks": False,
+        # Generation throttling (app/rate_limiter.py, app/concurrency.py)
+        "rate_limit_per_window": 10,
+        "max_concurrent_generations": 1,
+        "tier_concurrent_generations": 20,
     },
 }
 
@@ -16,6 +20,9 @@ PLAN_CONFIG = {
             "csv_export": True,
             "cro_audit": True,
             "ad_hooks": True,
+            "rate_limit_per_window": 60,
+            "max_concurrent_generations": 2,
+            "tier_concurrent_generations": 50,
         },
     },
     "price_growth_monthly": {
@@ -25,6 +32,9 @@ PLAN_CONFIG = {
             "csv_export": True,
             "cro_audit": True,
             "ad_hooks": True,
+            "rate_limit_per_window": 300,
+            "max_concurrent_generations": 5,
+            "tier_concurrent_generations": 100,
         },
     },
 }
@@ -1,17 +1,70 @@
+from typing import AsyncIterator
+from uuid import uuid4
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from app.config import get_settings
+from app.db_metrics import instrument_pool, timed_pool_class
 
 settings = get_settings()
 
 
+# --------------------------------------------------
+# Pool settings (shared by both engines)
+# --------------------------------------------------
+# Default: our own QueuePool, sized by db_pool_size + db_max_overflow per
+# worker process. Multiply by workers per node to get the connection
+# budget; /health → database_pool shows waits and overflow.
+#
+# db_pgbouncer: PgBouncer (transaction pooling) owns the pooling, so we
+# open a connection per checkout (NullPool) and skip anything that needs
+# session state — startup options and asyncpg's prepared statements.
+# Set statement_timeout on the database role instead
+# (ALTER ROLE ... SET statement_timeout = ...).
+def _pool_args(name: str, base_pool) -> dict:
+    if settings.db_pgbouncer:
+        return {"poolclass": NullPool}
+
+    return {
+        "poolclass": timed_pool_class(base_pool, name),
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        # one extra round trip per checkout; recycle below the server's
+        # idle timeout makes it optional
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def _statement_timeout() -> str | None:
+    if settings.db_pgbouncer or settings.db_statement_timeout_ms <= 0:
+        return None
+    return str(settings.db_statement_timeout_ms)
+
+
 # --------------------------------------------------
 # SQLAlchemy Engine
 # --------------------------------------------------
+def _sync_connect_args() -> dict:
+    timeout = _statement_timeout()
+    if timeout is None or not settings.database_url.startswith("postgres"):
+        return {}
+    return {"options": f"-c statement_timeout={timeout}"}
+
+
 engine = create_engine(
     settings.database_url,
     echo=False,
-    pool_pre_ping=True,  # avoids stale Supabase connections
+    connect_args=_sync_connect_args(),
+    **_pool_args("sync", QueuePool),
 )
 
 
@@ -26,6 +79,88 @@ SessionLocal = sessionmaker(
 )
 
 
+# --------------------------------------------------
+# Async engine (asyncpg) — used by the API
+# --------------------------------------------------
+# The sync engine above stays for Alembic and for background work that
+# already runs in a thread (Stripe outbox).
+def _async_engine_args(url: str):
+    """Same database as `database_url`, through the asyncpg driver."""
+    async_url = make_url(url)
+    connect_args = {}
+
+    if async_url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        async_url = async_url.set(drivername="postgresql+asyncpg")
+
+    if async_url.drivername == "postgresql+asyncpg":
+        # asyncpg doesn't understand libpq's sslmode
+        sslmode = async_url.query.get("sslmode")
+        if sslmode is not None:
+            async_url = async_url.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+
+        timeout = _statement_timeout()
+        if timeout is not None:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+
+        # Prepared statements don't survive transaction pooling
+        if settings.db_pgbouncer:
+            async_url = async_url.update_query_dict(
+                {"prepared_statement_cache_size": "0"}
+            )
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = (
+                lambda: f"__asyncpg_{uuid4()}__"
+            )
+
+    return async_url, connect_args
+
+
+_async_url, _async_connect_args = _async_engine_args(settings.database_url)
+
+async_engine = create_async_engine(
+    _async_url,
+    echo=False,
+    connect_args=_async_connect_args,
+    **_pool_args("async", AsyncAdaptedQueuePool),
+)
+
+instrument_pool(engine, "sync")
+instrument_pool(async_engine.sync_engine, "async")
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+# --------------------------------------------------
+# Read replica (optional) — routed by app/db_routing.py
+# --------------------------------------------------
+replica_engine = None
+AsyncReplicaSessionLocal = None
+
+if settings.database_replica_url:
+    _replica_url, _replica_connect_args = _async_engine_args(
+        settings.database_replica_url
+    )
+    replica_engine = create_async_engine(
+        _replica_url,
+        echo=False,
+        connect_args=_replica_connect_args,
+        **_pool_args("replica", AsyncAdaptedQueuePool),
+    )
+    instrument_pool(replica_engine.sync_engine, "replica")
+
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=replica_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
 # --------------------------------------------------
 # Base (USED BY ALEMBIC)
 # --------------------------------------------------
@@ -41,4 +176,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
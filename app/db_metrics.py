@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# ===============================
+# Connection pool metrics
+# ===============================
+# Per engine:
+#   - hold time: how long each connection stays checked out. A request
+#     that keeps its session open across slow work (e.g. the LLM chain)
+#     shows up as a long hold; holds above db_checkout_warn_seconds are
+#     counted and logged.
+#   - wait time: how long checkouts wait for a free connection, plus
+#     checkouts that had to open an overflow connection and pool timeouts. Waits mean the pool (or the
+#     number of workers per node) is too small for the load.
+# Exposed under "database_pool" in /health.
+
+_CHECKOUT_STARTED = "checkout_started"
+
+
+def _pct(values, pct: float) -> float:
+    return round(values[max(int(len(values) * pct) - 1, 0)] * 1e3, 1)
+
+
+class PoolMetrics:
+    def __init__(self, name: str, window: int = 1024):
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+        self._holds = deque(maxlen=window)  # seconds held
+        self._waits = deque(maxlen=window)  # seconds waited
+        self.checked_out = 0
+        self.checkouts = 0
+        self.long_holds = 0
+        self.max_hold = 0.0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+
+    # -------------------------
+    # Checkout wait (from timed_pool_class)
+    # -------------------------
+    def on_wait(self, waited: float, overflow: bool) -> None:
+        with self._lock:
+            self._waits.append(waited)
+            if overflow:
+                self.overflow_checkouts += 1
+
+    def on_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+        print(f"⚠️ DB pool ({self.name}) checkout timed out")
+
+    # -------------------------
+    # Hold time (pool events)
+    # -------------------------
+    def on_checkout(self, record) -> None:
+        record.info[_CHECKOUT_STARTED] = time.monotonic()
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+
+    def on_checkin(self, record) -> None:
+        started = record.info.pop(_CHECKOUT_STARTED, None)
+
+        with self._lock:
+            self.checked_out -= 1
+            # info is dropped when a connection is invalidated
+            if started is None:
+                return
+            held = time.monotonic() - started
+            self._holds.append(held)
+            self.max_hold = max(self.max_hold, held)
+            long_hold = held >= settings.db_checkout_warn_seconds
+            if long_hold:
+                self.long_holds += 1
+
+        if long_hold:
+            print(f"⚠️ DB connection ({self.name}) held for {held:.1f}s")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            holds = sorted(self._holds)
+            waits = sorted(self._waits)
+            stats = {
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "long_holds": self.long_holds,
+                "max_hold_ms": round(self.max_hold * 1e3, 1),
+                "overflow_checkouts": self.overflow_checkouts,
+                "timeouts": self.timeouts,
+            }
+
+        if holds:
+            stats["p50_hold_ms"] = _pct(holds, 0.5)
+            stats["p99_hold_ms"] = _pct(holds, 0.99)
+        if waits:
+            stats["p50_wait_ms"] = _pct(waits, 0.5)
+            stats["p99_wait_ms"] = _pct(waits, 0.99)
+
+        # Gauges from the pool itself (NullPool has none)
+        # (read via the engine: dispose() replaces the pool)
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, QueuePool):
+            stats["pool_size"] = pool.size()
+            stats["overflow"] = max(pool.overflow(), 0)
+            stats["checked_in"] = pool.checkedin()
+
+        return stats
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+
+
+def _get_metrics(name: str) -> PoolMetrics:
+    metrics = _metrics.get(name)
+    if metrics is None:
+        metrics = _metrics[name] = PoolMetrics(name)
+    return metrics
+
+
+# -------------------------
+# Pool classes that time checkout waits
+# -------------------------
+def timed_pool_class(base, name: str):
+    """
+    `base` (QueuePool / AsyncAdaptedQueuePool) with checkout wait,
+    overflow and timeout recorded under `name`.
+    """
+    metrics = _get_metrics(name)
+
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.monotonic()
+            overflow_before = self.overflow()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                metrics.on_timeout()
+                raise
+            # This checkout opened a connection beyond pool_size (not
+            # merely reused one while the pool was in overflow)
+            overflow_after = self.overflow()
+            created_overflow = overflow_after > max(overflow_before, 0)
+            metrics.on_wait(time.monotonic() - start, created_overflow)
+            return conn
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def instrument_pool(engine, name: str) -> PoolMetrics:
+    """Attach checkout/checkin listeners to a (sync) engine's pool."""
+    metrics = _get_metrics(name)
+    metrics.engine = engine
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        metrics.on_checkout(record)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        metrics.on_checkin(record)
+
+    return metrics
+
+
+def pool_metrics() -> dict:
+    """For /health."""
+    return {name: m.snapshot() for name, m in _metrics.items()}
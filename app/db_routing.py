@@ -0,0 +1,117 @@
+import asyncio
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db import AsyncReplicaSessionLocal, AsyncSessionLocal, replica_engine
+from app.tiered_cache import TieredCache
+
+settings = get_settings()
+
+# ===============================
+# Read-replica routing
+# ===============================
+# Pure reads (principal loads, /subscription/me, ...) go to the replica
+# when one is configured (database_replica_url), except:
+#   - the replica is lagging more than replica_max_lag_seconds, isn't
+#     streaming WAL, or its lag can't be measured → everything reads
+#     from the primary;
+#   - the user wrote in the last replica_read_your_writes_seconds
+#     (note_user_write) → their reads stay on the primary, so they see
+#     their own changes.
+# Writes always use the primary (get_async_db / AsyncSessionLocal).
+
+# user id -> 1 while their recent writes may not have replicated yet
+_recent_writes = TieredCache(
+    namespace="recentwrite",
+    ttl=settings.replica_read_your_writes_seconds,
+    l1_ttl=settings.replica_read_your_writes_seconds,
+)
+
+_replica_lag: Optional[float] = None  # seconds; None = unknown / unreachable
+
+# 0 when the replica has replayed everything it received (an idle primary
+# would otherwise look like growing lag). NULL when the WAL receiver isn't
+# streaming: receive = replay also holds for a replica that has stopped
+# replicating, so that must not read as "in sync".
+REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """
+)
+
+
+def replica_usable() -> bool:
+    return (
+        AsyncReplicaSessionLocal is not None
+        and _replica_lag is not None
+        and _replica_lag <= settings.replica_max_lag_seconds
+    )
+
+
+async def note_user_write(user_id: int) -> None:
+    """Pin the user's reads to the primary until their write has replicated."""
+    if AsyncReplicaSessionLocal is not None:
+        await _recent_writes.set(str(user_id), 1)
+
+
+async def read_session(user_id: Optional[int] = None) -> AsyncSession:
+    """
+    Session for read-only work on behalf of `user_id`: replica when it's
+    safe, otherwise primary. Use as `async with await read_session(uid)`.
+    """
+    if not replica_usable():
+        return AsyncSessionLocal()
+
+    if user_id is not None and await _recent_writes.get(str(user_id)) is not None:
+        return AsyncSessionLocal()
+
+    return AsyncReplicaSessionLocal()
+
+
+async def run_replica_lag_monitor() -> None:
+    """Measure replica lag periodically; started from the app lifespan."""
+    global _replica_lag
+
+    if replica_engine is None:
+        return
+
+    while True:
+        try:
+            async with replica_engine.connect() as conn:
+                lag = await conn.scalar(REPLICA_LAG_SQL)
+            if lag is None:
+                if _replica_lag is not None:
+                    print("⚠️ Replica not streaming WAL, reading from primary")
+            elif lag > settings.replica_max_lag_seconds and replica_usable():
+                print(f"⚠️ Replica lag {lag:.1f}s, reading from primary")
+            _replica_lag = float(lag) if lag is not None else None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if _replica_lag is not None:
+                print("⚠️ Replica unreachable, reading from primary:", str(e))
+            _replica_lag = None
+
+        await asyncio.sleep(settings.replica_lag_check_seconds)
+
+
+def replica_status() -> dict:
+    """For /health."""
+    if replica_engine is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "lag_seconds": _replica_lag,
+        "in_use": replica_usable(),
+    }
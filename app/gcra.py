@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class GCRADecision(NamedTuple):
+    allowed: bool
+    remaining: int
+    reset_in_seconds: float
+    retry_after_seconds: float
+
+
+class GCRALimiter:
+    """
+    In-process rate limiter using GCRA (generic cell rate algorithm).
+
+    State is one float per key: the theoretical arrival time (TAT).
+    `limit` requests per `window` gives an emission interval
+    T = window / limit and a burst tolerance of `limit` requests, so a
+    fresh key can spend its whole allowance at once and then regains one
+    request every T seconds — the same burst and sustained rate as the
+    Redis sliding window (GCRA refills continuously rather than when the
+    oldest request leaves the window).
+
+    Keys whose TAT is in the past are fully reset and carry no
+    information, so a periodic sweep drops them; `max_keys` bounds the
+    table in between (least recently used keys go first).
+
+    Intended for the event loop: calls are synchronous and never await.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = 100_000,
+        sweep_interval_seconds: float = 60.0,
+    ):
+        self.max_keys = max_keys
+        self.sweep_interval_seconds = sweep_interval_seconds
+
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval_seconds
+
+    def _sweep(self, now: float) -> None:
+        expired = [key for key, tat in self._tat.items() if tat <= now]
+        for key in expired:
+            del self._tat[key]
+        self._next_sweep = now + self.sweep_interval_seconds
+
+    def hit(
+        self,
+        key: str,
+        limit: int,
+        window_seconds: float,
+        now: Optional[float] = None,
+    ) -> GCRADecision:
+        now = time.monotonic() if now is None else now
+
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        interval = window_seconds / limit
+        tolerance = window_seconds - interval
+
+        tat = max(self._tat.get(key, now), now)
+        allow_at = tat - tolerance
+
+        if now < allow_at:
+            return GCRADecision(
+                allowed=False,
+                remaining=0,
+                reset_in_seconds=tat - now,
+                retry_after_seconds=allow_at - now,
+            )
+
+        new_tat = tat + interval
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+
+        if len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+
+        remaining = int((now - (new_tat - tolerance)) // interval) + 1
+        return GCRADecision(
+            allowed=True,
+            remaining=max(remaining, 0),
+            reset_in_seconds=new_tat - now,
+            retry_after_seconds=0.0,
+        )
+
+    def reset(self, key: str) -> None:
+        self._tat.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._tat)
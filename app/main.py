@@ -1,26 +1,43 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 
 # ⚙️ CONFIG
 from app.config import get_settings
 
 # 🗄 DATABASE
-from app.db import engine
+from app.db import async_engine, replica_engine
+from app.db_metrics import pool_metrics
+from app.db_routing import replica_status, run_replica_lag_monitor
 
 # 🔐 AUTH
-from app.auth.deps import get_current_user
-from app.model.user import User
+from app.auth.deps import get_current_user, get_current_plan
+from app.schemas.user import AuthenticatedUser
 
 # 🔁 ROUTERS
 from app.auth.routes import router as auth_router
 from app.routes.users import router as users_router
+from app.api.optimization import router as optimization_router
+from app.api.generations import router as generations_router
+from app.api.subscription import router as subscription_router
+from app.api.billing import router as billing_router
 from app.webhooks.stripe import router as stripe_webhook_router
 
 # 🧠 CORE LOGIC
 from app.chain import runPromptChain
-from app.rate_limiter import check_rate_limit
+from app.rate_limit_middleware import RateLimitMiddleware, RateLimitRule
+from app.rate_limiter import return_leases, run_lease_reaper
+from app.concurrency import acquire_generation_slot, release_generation_slot
+from app.plan_cache import cache_plan
+from app.redis_client import init_redis, close_redis, redis_status
+from app.auth.passwords import shutdown_password_pool
+from app.tiered_cache import run_invalidation_listener
+from app.services.stripe_customer_service import run_stripe_outbox_worker
+from app.usage_buffer import drain_usage, run_usage_flusher
+from app.services.quota_service import run_reservation_reaper
+from app.services.generation_service import save_generation
 
 # 📦 SCHEMAS
 from app.models import ProductInfoRequest, Prompt1OnlyRequest
@@ -32,7 +49,29 @@ settings = get_settings()
 # =========================
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await init_redis()
+    invalidation_task = asyncio.create_task(run_invalidation_listener())
+    lease_reaper_task = asyncio.create_task(run_lease_reaper())
+    stripe_outbox_task = asyncio.create_task(run_stripe_outbox_worker())
+    usage_flusher_task = asyncio.create_task(run_usage_flusher())
+    reservation_reaper_task = asyncio.create_task(run_reservation_reaper())
+    replica_monitor_task = asyncio.create_task(run_replica_lag_monitor())
     yield
+    invalidation_task.cancel()
+    lease_reaper_task.cancel()
+    stripe_outbox_task.cancel()
+    usage_flusher_task.cancel()
+    reservation_reaper_task.cancel()
+    replica_monitor_task.cancel()
+    if settings.usage_buffer_enabled:
+        await drain_usage()
+    await return_leases(expired_only=False)
+    await close_redis()
+    shutdown_password_pool()
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
 # =========================
 # APP INIT
 # =========================
@@ -43,6 +82,19 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# =========================
+# RATE LIMITS (before auth / DB)
+# =========================
+# (method, path) → rule. Routes sharing a scope share one budget;
+# limit=None uses the user's plan limit.
+RATE_LIMIT_ROUTES = {
+    ("POST", "/api/generate"): RateLimitRule(scope="generate"),
+    ("POST", "/api/generate/prompt1"): RateLimitRule(scope="generate"),
+    ("POST", "/optimize"): RateLimitRule(scope="generate"),
+}
+
+app.add_middleware(RateLimitMiddleware, routes=RATE_LIMIT_ROUTES)
+
 # =========================
 # CORS
 # =========================
@@ -52,6 +104,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # =========================
@@ -59,6 +112,10 @@ app.add_middleware(
 # =========================
 app.include_router(auth_router)
 app.include_router(users_router)
+app.include_router(optimization_router)
+app.include_router(generations_router)
+app.include_router(subscription_router)
+app.include_router(billing_router)
 app.include_router(stripe_webhook_router)
 
 # =========================
@@ -76,46 +133,79 @@ async def root():
             "me": "/users/me",
             "generate_full": "/api/generate",
             "generate_prompt1_only": "/api/generate/prompt1",
+            "optimize": "/optimize",
+            "generations": "/generations",
+            "subscription": "/subscription/me",
+            "checkout": "/billing/checkout",
             "stripe_webhook": "/webhooks/stripe",
         },
     }
 
 
 from sqlalchemy import text
-from app.db import engine
 
 @app.get("/health")
 async def health():
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "ok"}
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return {
+            "status": "healthy",
+            "database": "ok",
+            "database_pool": pool_metrics(),
+            "replica": replica_status(),
+            "redis": redis_status(),
+        }
     except Exception as e:
         return JSONResponse(
             status_code=503,
-            content={"status": "unhealthy", "database": str(e)},
+            content={
+                "status": "unhealthy",
+                "database": str(e),
+                "database_pool": pool_metrics(),
+                "redis": redis_status(),
+            },
         )
 
+
+def _too_many_requests(error: str, reset_in: int | None = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": error,
+            "remaining_requests": 0,
+            "reset_in_seconds": reset_in,
+        },
+    )
+
+
 # =========================
 # FULL CHAIN (AUTH REQUIRED)
 # =========================
 @app.post("/api/generate")
 async def generate_full_chain(
     request: ProductInfoRequest,
-    current_user: User = Depends(get_current_user),
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    plan: dict = Depends(get_current_plan),
 ):
     user_id = str(current_user.id)
 
-    allowed, remaining = check_rate_limit(user_id)
-    if not allowed:
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "Rate limit exceeded",
-                "remaining_requests": 0,
-                "reset_in_seconds": settings.rate_limit_window_seconds,
-            },
-        )
+    # Let the rate-limit middleware see this plan on the next request
+    if getattr(http_request.state, "plan", None) != plan:
+        await cache_plan(user_id, plan)
+
+    # Set by RateLimitMiddleware
+    rate_limit = getattr(http_request.state, "rate_limit", None)
+    remaining = rate_limit.remaining if rate_limit else None
+
+    slot = await acquire_generation_slot(user_id, plan)
+    if slot is None:
+        return _too_many_requests("Too many generations in progress")
+
+    # No DB connection is held from here on: the principal came from the
+    # cache or a session that closed inside get_current_user.
 
     try:
         result = await runPromptChain(
@@ -127,12 +217,24 @@ async def generate_full_chain(
             run_prompt4=True,
         )
 
+        # Stored after the response is sent (generation history)
+        background_tasks.add_task(
+            save_generation,
+            current_user.id,
+            "full",
+            request.product_info,
+            dict(result),
+        )
+
         result["rate_limit"] = {"remaining_requests": remaining}
         return result
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    finally:
+        await release_generation_slot(slot)
+
 
 # =========================
 # PROMPT 1 ONLY (AUTH REQUIRED)
@@ -140,20 +242,27 @@ async def generate_full_chain(
 @app.post("/api/generate/prompt1")
 async def generate_prompt1_only(
     request: Prompt1OnlyRequest,
-    current_user: User = Depends(get_current_user),
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    plan: dict = Depends(get_current_plan),
 ):
     user_id = str(current_user.id)
 
-    allowed, remaining = check_rate_limit(user_id)
-    if not allowed:
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "Rate limit exceeded",
-                "remaining_requests": 0,
-                "reset_in_seconds": settings.rate_limit_window_seconds,
-            },
-        )
+    # Let the rate-limit middleware see this plan on the next request
+    if getattr(http_request.state, "plan", None) != plan:
+        await cache_plan(user_id, plan)
+
+    # Set by RateLimitMiddleware
+    rate_limit = getattr(http_request.state, "rate_limit", None)
+    remaining = rate_limit.remaining if rate_limit else None
+
+    slot = await acquire_generation_slot(user_id, plan)
+    if slot is None:
+        return _too_many_requests("Too many generations in progress")
+
+    # No DB connection is held from here on: the principal came from the
+    # cache or a session that closed inside get_current_user.
 
     try:
         result = await runPromptChain(
@@ -165,6 +274,15 @@ async def generate_prompt1_only(
             run_prompt4=False,
         )
 
+        # Stored after the response is sent (generation history)
+        background_tasks.add_task(
+            save_generation,
+            current_user.id,
+            "prompt1",
+            request.product_info,
+            dict(result),
+        )
+
         result["rate_limit"] = {"remaining_requests": remaining}
         return result
 
@@ -173,3 +291,6 @@ async def generate_prompt1_only(
             status_code=500,
             detail="AI generation failed. Please try again.",
         )
+
+    finally:
+        await release_generation_slot(slot)
@@ -0,0 +1,147 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LRUCache:
+    """
+    In-process LRU cache bounded by entry count and total bytes,
+    with a per-entry TTL.
+
+    A plain lock guards every operation, so the same instance can be
+    used from the event loop and from threadpool handlers. Operations
+    are O(1) and never await, so holding the lock is cheap.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl: Optional[float] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+
+        # key -> (value, size_bytes, expires_at | None)
+        self._data: "OrderedDict[str, tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # -------------------------
+    # Helpers
+    # -------------------------
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        """Approximate memory held by `value`, following containers."""
+        total = 0
+        seen = set()
+        stack = [value]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            total += sys.getsizeof(obj)
+
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+            elif not isinstance(obj, (str, bytes, int, float)) and hasattr(
+                obj, "__dict__"
+            ):
+                # Plain objects / pydantic models
+                stack.append(vars(obj))
+        return total
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        while self._data and (
+            len(self._data) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, _, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        """`size` overrides the in-memory byte estimate."""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        size = self._sizeof(value) if size is None else size
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            # Never let a single oversized value flush the whole cache
+            if size > self.max_bytes:
+                return
+
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
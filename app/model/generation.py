@@ -0,0 +1,40 @@
+from sqlalchemy import (
+    Column,
+    BigInteger,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    LargeBinary,
+    Index,
+)
+from sqlalchemy.sql import func
+
+from app.db import Base
+
+
+class Generation(Base):
+    """A prompt chain result, kept so users can reopen it without paying again."""
+
+    __tablename__ = "generations"
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # 📦 What was generated
+    kind = Column(String(16), nullable=False)
+    # full | prompt1 | optimize
+    product_info = Column(String(512), nullable=False)  # truncated for lists
+
+    # 🗜 Result (app/services/generation_service.py codec; never read by lists)
+    result = Column(LargeBinary, nullable=False)
+
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        # Keyset pagination: WHERE user_id = ? AND (created_at, id) < (?, ?)
+        # ORDER BY created_at DESC, id DESC
+        Index("ix_generations_user_created_id", "user_id", "created_at", "id"),
+    )
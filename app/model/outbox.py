@@ -0,0 +1,54 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    JSON,
+    Index,
+)
+from datetime import datetime, timezone
+from app.db import Base
+
+
+class OutboxEvent(Base):
+    """
+    Side effect to perform after a commit (transactional outbox).
+    Written in the same transaction as the row it belongs to and
+    processed by a background worker (see app/services/stripe_customer_service.py).
+    """
+
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # 🔗 Relations
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # 📦 Event
+    event_type = Column(String, nullable=False)
+    # stripe.customer.create
+    payload = Column(JSON, nullable=False, default=dict)
+
+    # 🔁 Delivery state
+    status = Column(String, nullable=False, default="pending")
+    # pending | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    last_error = Column(String, nullable=True)
+
+    # 🕒 Metadata
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Worker poll: pending events that are due
+        Index("ix_outbox_events_status_due", "status", "next_attempt_at"),
+    )
@@ -5,6 +5,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Boolean,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -47,4 +48,15 @@ class Subscription(Base):
     )
 
     # 🔁 ORM relation
-    user = relationship("User", back_populates="subscriptions")
\ No newline at end of file
+    user = relationship("User", back_populates="subscriptions")
+
+    __table_args__ = (
+        # By user: the principal's selectin load, and the latest by
+        # status for /subscription/me
+        Index(
+            "ix_subscriptions_user_status_created",
+            "user_id",
+            "status",
+            "created_at",
+        ),
+    )
@@ -1,4 +1,12 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import (
+    Column,
+    Integer,
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    String,
+)
 from sqlalchemy.sql import func
 
 from app.db import Base
@@ -11,6 +19,14 @@ class Usage(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     optimizations_used = Column(Integer, default=0)
+    # Held by in-progress optimizations (app/services/quota_service.py)
+    optimizations_reserved = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+
+    # Last Redis buffer flush applied to this row (app/usage_buffer.py);
+    # makes replayed flushes no-ops
+    flush_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     period_start = Column(DateTime(timezone=True), nullable=False)
     period_end = Column(DateTime(timezone=True), nullable=False)
@@ -20,4 +36,26 @@ class Usage(Base):
         DateTime(timezone=True),
         server_default=func.now(),
         onupdate=func.now(),
-    )
\ No newline at end of file
+    )
+
+    __table_args__ = (
+        # One row per user per billing period (lookups + metering upsert)
+        UniqueConstraint(
+            "user_id", "period_start", "period_end",
+            name="uq_usage_user_period",
+        ),
+    )
+
+
+class UsageReservation(Base):
+    """One quota unit held by an in-progress optimization."""
+
+    __tablename__ = "usage_reservations"
+
+    id = Column(String(36), primary_key=True)  # uuid token
+    usage_id = Column(Integer, ForeignKey("usage.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # Abandoned reservations are released after this
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,26 @@
+from typing import Optional
+
+from app.config import get_settings
+from app.tiered_cache import TieredCache
+
+settings = get_settings()
+
+# Resolved plan per user, so request-path code (the rate-limit
+# middleware) can learn a user's limits without touching Postgres.
+# Invalidated by the Stripe webhook when a subscription changes.
+plan_cache = TieredCache(
+    namespace="plan",
+    ttl=settings.plan_cache_ttl_seconds,
+)
+
+
+async def get_cached_plan(user_id: int | str) -> Optional[dict]:
+    return await plan_cache.get(str(user_id))
+
+
+async def cache_plan(user_id: int | str, plan: dict) -> None:
+    await plan_cache.set(str(user_id), plan)
+
+
+async def invalidate_plan(user_id: int | str) -> None:
+    await plan_cache.invalidate(str(user_id))
@@ -0,0 +1,177 @@
+import json
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from app.auth.entitlements import entitlement_from_payload
+from app.config import get_settings
+from app.plan_cache import get_cached_plan
+from app.rate_limiter import check_rate_limit
+
+settings = get_settings()
+
+
+class RateLimitRule(NamedTuple):
+    """
+    scope:          counter namespace; routes sharing a scope share a budget
+    limit:          requests per window; None → the user's plan limit
+                    (token entitlement, else the plan cache)
+    window_seconds: None → settings.rate_limit_window_seconds
+    key:            "user" (JWT subject) or "ip"
+    """
+
+    scope: str
+    limit: Optional[int] = None
+    window_seconds: Optional[int] = None
+    key: str = "user"
+
+
+RouteTable = Dict[Tuple[str, str], RateLimitRule]
+
+
+def _header(scope: dict, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _token_payload(scope: dict) -> Optional[dict]:
+    """Verify the bearer token and return its claims. No DB access."""
+    auth = _header(scope, b"authorization")
+    if not auth or not auth.lower().startswith("bearer "):
+        return None
+
+    try:
+        payload = jwt.decode(
+            auth[7:],
+            settings.jwt_secret,
+            algorithms=[settings.jwt_algorithm],
+        )
+    except JWTError:
+        return None
+
+    return payload if payload.get("sub") is not None else None
+
+
+class RateLimitMiddleware:
+    """
+    Enforce per-route rate limits before routing, auth dependencies or
+    DB work run. Limits come from a route table keyed by
+    (method, path); unlisted routes pass straight through.
+
+    Requests without a valid token on a "user" rule pass through too —
+    the route's own auth dependency rejects them.
+
+    Adds `RateLimit-Limit`, `RateLimit-Remaining`, `RateLimit-Reset`
+    headers to limited routes, plus `Retry-After` on 429. The result is
+    left in request.state.rate_limit for handlers, and a valid token
+    entitlement in request.state.entitlement.
+    """
+
+    def __init__(self, app, routes: RouteTable):
+        self.app = app
+        self.routes = routes
+
+    async def _resolve_limit(
+        self,
+        rule: RateLimitRule,
+        scope: dict,
+        identity: str,
+        payload: Optional[dict],
+    ) -> int:
+        if rule.limit is not None:
+            return rule.limit
+
+        if payload is not None:
+            entitlement = await entitlement_from_payload(payload)
+            if entitlement is not None:
+                state = scope.setdefault("state", {})
+                state["plan"] = entitlement.plan
+                # Reused by get_current_entitlement
+                state["entitlement"] = entitlement
+                return entitlement.plan["limits"]["rate_limit_per_window"]
+
+        if rule.key == "user":
+            plan = await get_cached_plan(identity)
+            scope.setdefault("state", {})["plan"] = plan
+            if plan is not None:
+                return plan["limits"]["rate_limit_per_window"]
+
+        # Plan not cached yet (first request since it expired)
+        return settings.rate_limit_per_user
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.routes.get((scope["method"], scope["path"]))
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        payload = _token_payload(scope) if rule.key == "user" else None
+
+        if rule.key == "ip":
+            client = scope.get("client")
+            identity = client[0] if client else None
+        else:
+            identity = str(payload["sub"]) if payload else None
+
+        if identity is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = await self._resolve_limit(rule, scope, identity, payload)
+        result = await check_rate_limit(
+            f"{rule.scope}:{identity}",
+            max_requests=limit,
+            window_seconds=rule.window_seconds,
+        )
+
+        headers = [
+            (b"ratelimit-limit", str(limit).encode()),
+            (b"ratelimit-remaining", str(result.remaining).encode()),
+            (b"ratelimit-reset", str(result.reset_in_seconds).encode()),
+        ]
+
+        if not result.allowed:
+            retry_after = (
+                result.retry_after_seconds
+                if result.retry_after_seconds is not None
+                else result.reset_in_seconds
+            )
+            body = json.dumps(
+                {
+                    "error": "Rate limit exceeded",
+                    "remaining_requests": 0,
+                    "reset_in_seconds": result.reset_in_seconds,
+                }
+            ).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": headers
+                    + [
+                        (b"retry-after", str(retry_after).encode()),
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        scope.setdefault("state", {})["rate_limit"] = result
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + headers,
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,101 +1,260 @@
+import asyncio
 import time
-from typing import Dict, Tuple
-from datetime import datetime, timedelta
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from app.config import get_settings
+from app.gcra import GCRALimiter
+from app.redis_client import get_redis, report_redis_error
 
 settings = get_settings()
 
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    reset_in_seconds: int
+    # When the next request would be admitted, if sooner than the reset
+    # (GCRA fallback); None → reset_in_seconds
+    retry_after_seconds: Optional[int] = None
+
+
+# ===============================
+# Redis sliding window (atomic)
+# ===============================
+# Trim, count, admit and report in one server-side step, so concurrent
+# requests can't all pass the count check before any of them is added.
+#
+# The same script hands out leases: it can admit `want` entries at once
+# and first give back unused members from an earlier lease.
+#
+# KEYS[1] = rate limit key
+# ARGV    = now_ms, window_ms, limit, member prefix, want, returned members...
+# Returns {granted, remaining, reset_ms}
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local prefix = ARGV[4]
+local want = tonumber(ARGV[5])
+
+if #ARGV >= 6 then
+    redis.call('ZREM', key, unpack(ARGV, 6, #ARGV))
+end
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+
+local granted = math.max(math.min(want, limit - count), 0)
+for i = 1, granted do
+    redis.call('ZADD', key, now, prefix .. ':' .. i)
+end
+count = count + granted
+
+redis.call('PEXPIRE', key, window)
+
+local reset_ms = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset_ms = tonumber(oldest[2]) + window - now
+end
+
+return {granted, limit - count, reset_ms}
+"""
+
+# Script objects are bound to a client; re-register if the client changes
+_script = None
+_script_client = None
+
+
+def _sliding_window_script(redis):
+    global _script, _script_client
+
+    if _script is None or _script_client is not redis:
+        _script = redis.register_script(SLIDING_WINDOW_LUA)
+        _script_client = redis
+    return _script
+
+
+async def _run_window(
+    redis,
+    key: str,
+    max_requests: int,
+    window_seconds: int,
+    want: int,
+    returned: Optional[List[str]] = None,
+) -> Tuple[List[str], int, int]:
+    """Returns (granted members, remaining, reset_in_seconds)."""
+    now_ms = int(time.time() * 1000)
+    prefix = f"{now_ms}-{uuid.uuid4().hex}"  # never collides
+
+    args = [now_ms, window_seconds * 1000, max_requests, prefix, want]
+    args.extend(returned or [])
+
+    granted, remaining, reset_ms = await _sliding_window_script(redis)(
+        keys=[key],
+        args=args,
+    )
+    members = [f"{prefix}:{i}" for i in range(1, int(granted) + 1)]
+    return members, max(int(remaining), 0), max(-(-int(reset_ms) // 1000), 0)
+
+
 # ===============================
-# Redis setup (optional, safe)
+# Local leasing (optional)
 # ===============================
+# For hot keys, a worker takes a batch of allowance in one round trip
+# and spends it locally. Leased units already count against the global
+# window, so the limit is never exceeded; the error is the other way:
+# up to (workers - 1) * lease_size units may sit unused in other
+# workers' leases until they are spent, returned or the lease expires.
+
+
+class _Lease:
+    __slots__ = ("members", "remaining", "reset_at", "expires_at")
+
+    def __init__(self, members: List[str], remaining: int, reset_in: int):
+        self.members = members
+        self.remaining = remaining
+        self.reset_at = time.time() + reset_in
+        self.expires_at = time.monotonic() + settings.rate_limit_lease_ttl_seconds
 
-USE_REDIS = bool(settings.enable_redis)
-redis_client = None
 
-if USE_REDIS:
-    try:
-        import redis  # lazy import
+# rate limit key → (lease, max_requests, window_seconds)
+_leases: Dict[str, Tuple[_Lease, int, int]] = {}
 
-        redis_client = redis.from_url(
-            settings.redis_url,
-            decode_responses=True,
-            socket_connect_timeout=2,
-            socket_timeout=2,
-            retry_on_timeout=True,
-        )
 
-        redis_client.ping()
-        print("✅ Redis rate limiting enabled")
+def _should_lease(max_requests: int) -> bool:
+    return (
+        settings.rate_limit_lease_enabled
+        and max_requests >= settings.rate_limit_lease_min_limit
+    )
+
+
+async def _check_leased(
+    redis,
+    key: str,
+    max_requests: int,
+    window_seconds: int,
+) -> RateLimitResult:
+    entry = _leases.get(key)
+
+    if entry is not None:
+        lease = entry[0]
+        if lease.expires_at > time.monotonic() and lease.members:
+            lease.members.pop()
+            return RateLimitResult(
+                True,
+                lease.remaining + len(lease.members),
+                max(int(lease.reset_at - time.time() + 0.999), 0),
+            )
+        del _leases[key]
+
+    returned = entry[0].members if entry is not None else []
+    want = min(settings.rate_limit_lease_size, max_requests)
+
+    members, remaining, reset_in = await _run_window(
+        redis, key, max_requests, window_seconds, want, returned
+    )
+    if not members:
+        return RateLimitResult(False, 0, reset_in)
+
+    members.pop()  # spent by this request
+
+    if members:
+        current = _leases.get(key)
+        if current is not None:
+            # Another request on this worker leased concurrently; merge
+            current[0].members.extend(members)
+        else:
+            lease = _Lease(members, remaining, reset_in)
+            _leases[key] = (lease, max_requests, window_seconds)
+
+    return RateLimitResult(True, remaining + len(members), reset_in)
+
+
+async def return_leases(expired_only: bool = True) -> None:
+    """Give unused leased allowance back to Redis."""
+    redis = get_redis()
+    now = time.monotonic()
+
+    for key, (lease, max_requests, window_seconds) in list(_leases.items()):
+        if expired_only and lease.expires_at > now:
+            continue
+
+        _leases.pop(key, None)
+        if redis is None or not lease.members:
+            continue
+
+        try:
+            await _run_window(redis, key, max_requests, window_seconds, 0, lease.members)
+        except Exception as e:
+            report_redis_error(e)
+
+
+async def run_lease_reaper() -> None:
+    """Return expired leases so idle workers don't hold allowance."""
+    if not settings.rate_limit_lease_enabled:
+        return
+
+    while True:
+        await asyncio.sleep(settings.rate_limit_lease_ttl_seconds)
+        await return_leases(expired_only=True)
 
-    except Exception as e:
-        USE_REDIS = False
-        redis_client = None
-        print(f"⚠️ Redis unavailable, using in-memory limiter ({e})")
 
 # ===============================
 # In-memory fallback (DEV / FAILSAFE)
 # ===============================
+# O(1) per check, one float per user, idle users swept (see app/gcra.py)
 
-_user_requests: Dict[str, list] = {}
+_memory_limiter = GCRALimiter(
+    max_keys=settings.rate_limit_memory_max_keys,
+    sweep_interval_seconds=settings.rate_limit_memory_sweep_seconds,
+)
 
 
-def check_rate_limit(user_id: str) -> Tuple[bool, int]:
+async def check_rate_limit(
+    user_id: str,
+    max_requests: Optional[int] = None,
+    window_seconds: Optional[int] = None,
+) -> RateLimitResult:
     """
-    Check if user has exceeded rate limit.
+    Check if user has exceeded rate limit, and count this request if not.
 
     Returns:
-        (is_allowed: bool, remaining_requests: int)
+        RateLimitResult(allowed, remaining, reset_in_seconds, retry_after_seconds)
     """
 
-    window_seconds = settings.rate_limit_window_seconds
-    max_requests = settings.rate_limit_per_user
+    window_seconds = window_seconds or settings.rate_limit_window_seconds
+    max_requests = max_requests or settings.rate_limit_per_user
 
     # ===============================
     # Redis-based rate limiting (PROD)
     # ===============================
-    if USE_REDIS and redis_client:
+    redis = get_redis()
+    if redis is not None:
         key = f"rate_limit:{user_id}"
-        now = time.time()
-        window_start = now - window_seconds
 
         try:
-            pipe = redis_client.pipeline()
-            pipe.zremrangebyscore(key, 0, window_start)
-            pipe.zcard(key)
-            results = pipe.execute()
-
-            request_count = results[1]
+            if _should_lease(max_requests):
+                return await _check_leased(redis, key, max_requests, window_seconds)
 
-            if request_count >= max_requests:
-                return False, 0
+            members, remaining, reset_in = await _run_window(
+                redis, key, max_requests, window_seconds, want=1
+            )
+            return RateLimitResult(bool(members), remaining, reset_in)
 
-            redis_client.zadd(key, {str(now): now})
-            redis_client.expire(key, window_seconds)
-
-            remaining = max_requests - request_count - 1
-            return True, remaining
-
-        except Exception:
+        except Exception as e:
             # Redis failed mid-request → fallback
-            pass
+            report_redis_error(e)
 
     # ===============================
     # In-memory fallback (SAFE)
     # ===============================
-    now = datetime.utcnow()
-    window_start = now - timedelta(seconds=window_seconds)
-
-    if user_id not in _user_requests:
-        _user_requests[user_id] = []
-
-    _user_requests[user_id] = [
-        t for t in _user_requests[user_id] if t > window_start
-    ]
-
-    if len(_user_requests[user_id]) >= max_requests:
-        return False, 0
-
-    _user_requests[user_id].append(now)
-    remaining = max_requests - len(_user_requests[user_id])
-    return True, remaining
\ No newline at end of file
+    decision = _memory_limiter.hit(user_id, max_requests, window_seconds)
+    return RateLimitResult(
+        decision.allowed,
+        decision.remaining,
+        max(int(decision.reset_in_seconds + 0.999), 0),
+        max(int(decision.retry_after_seconds + 0.999), 0),
+    )
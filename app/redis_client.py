@@ -0,0 +1,205 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
+
+from app.config import get_settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+settings = get_settings()
+
+# ===============================
+# Shared async Redis pool
+# ===============================
+# One pool per worker, created in the lifespan hook and shared by the
+# cache and the rate limiter. Nothing here blocks the event loop.
+# A second, non-decoding client carries binary cache payloads.
+#
+# Connectivity is self-healing: callers report errors, every successful
+# command resets the count (_TrackedRedis), and after
+# `redis_failure_threshold` consecutive failures the circuit opens and
+# get_redis() returns None immediately (memory fallbacks take over
+# without waiting out socket timeouts). A background probe pings Redis
+# with exponential backoff and closes the circuit once it answers.
+
+_redis: Optional["Redis"] = None
+_redis_binary: Optional["Redis"] = None
+
+_healthy = False
+_consecutive_failures = 0
+_last_error: Optional[str] = None
+_last_state_change: Optional[float] = None
+_probe_task: Optional[asyncio.Task] = None
+_wake_probe: Optional[asyncio.Event] = None
+
+
+def _set_healthy(healthy: bool) -> None:
+    global _healthy, _last_state_change, _consecutive_failures
+
+    if healthy == _healthy:
+        return
+
+    _healthy = healthy
+    _last_state_change = time.time()
+
+    if healthy:
+        _consecutive_failures = 0
+        print("✅ Redis connection restored")
+    else:
+        print(f"⚠️ Redis circuit open, using in-memory fallbacks ({_last_error})")
+        if _wake_probe is not None:
+            _wake_probe.set()
+
+
+async def _ping() -> None:
+    await asyncio.wait_for(_redis.ping(), timeout=settings.redis_probe_timeout_seconds)
+
+
+async def _probe_loop() -> None:
+    global _last_error
+
+    backoff = settings.redis_probe_min_backoff_seconds
+
+    while True:
+        if _healthy:
+            # Healthy: light periodic ping; wake early if callers trip the circuit
+            try:
+                await asyncio.wait_for(
+                    _wake_probe.wait(), timeout=settings.redis_probe_interval_seconds
+                )
+            except asyncio.TimeoutError:
+                pass
+            _wake_probe.clear()
+
+            if not _healthy:
+                continue
+
+            try:
+                await _ping()
+                report_redis_success()
+            except Exception as e:
+                report_redis_error(e)
+            continue
+
+        # Unhealthy: probe with exponential backoff
+        try:
+            await _ping()
+            _set_healthy(True)
+            backoff = settings.redis_probe_min_backoff_seconds
+        except Exception as e:
+            _last_error = str(e) or type(e).__name__
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, settings.redis_probe_max_backoff_seconds)
+
+
+def _tracked_client_class(aioredis):
+    class _TrackedRedis(aioredis.Redis):
+        """Client whose successful commands (incl. scripts) reset the failure count."""
+
+        async def execute_command(self, *args, **options):
+            result = await super().execute_command(*args, **options)
+            report_redis_success()
+            return result
+
+    return _TrackedRedis
+
+
+async def init_redis() -> None:
+    global _redis, _redis_binary, _probe_task, _wake_probe, _last_error
+
+    if not redis_enabled():
+        print("⚠️ Redis disabled, using in-memory cache and limiter")
+        return
+
+    import redis.asyncio as aioredis  # lazy import
+
+    client_class = _tracked_client_class(aioredis)
+
+    def pool(decode_responses: bool):
+        # Blocking: a burst beyond max_connections waits for a free
+        # connection instead of failing (and tripping the circuit)
+        return aioredis.BlockingConnectionPool.from_url(
+            settings.redis_url,
+            decode_responses=decode_responses,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+            retry_on_timeout=True,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout_seconds,
+        )
+
+    _redis = client_class(connection_pool=pool(decode_responses=True))
+    _redis_binary = client_class(connection_pool=pool(decode_responses=False))
+
+    try:
+        await _ping()
+        _set_healthy(True)
+    except Exception as e:
+        _last_error = str(e) or type(e).__name__
+        print(f"⚠️ Redis unavailable at startup, will keep probing ({_last_error})")
+
+    _wake_probe = asyncio.Event()
+    _probe_task = asyncio.create_task(_probe_loop())
+
+
+async def close_redis() -> None:
+    global _redis, _redis_binary, _probe_task, _healthy
+
+    if _probe_task is not None:
+        _probe_task.cancel()
+        _probe_task = None
+
+    for client in (_redis, _redis_binary):
+        if client is not None:
+            await client.aclose(close_connection_pool=True)
+
+    _redis = None
+    _redis_binary = None
+    _healthy = False
+
+
+def redis_enabled() -> bool:
+    """True when Redis is configured, whether or not it is reachable now."""
+    return bool(settings.enable_redis and settings.redis_url)
+
+
+def get_redis(binary: bool = False) -> Optional["Redis"]:
+    """
+    Return the shared async client, or None when Redis is off or the
+    circuit is open. binary=True returns a client that does not decode
+    responses.
+    """
+    if not _healthy:
+        return None
+    return _redis_binary if binary else _redis
+
+
+def report_redis_error(exc: Exception) -> None:
+    """Callers report failed Redis calls; enough of them open the circuit."""
+    global _consecutive_failures, _last_error
+
+    _consecutive_failures += 1
+    _last_error = str(exc) or type(exc).__name__
+
+    if _healthy and _consecutive_failures >= settings.redis_failure_threshold:
+        _set_healthy(False)
+
+
+def report_redis_success() -> None:
+    """Called for every successful command; failures must be consecutive."""
+    global _consecutive_failures
+    _consecutive_failures = 0
+
+
+def redis_status() -> dict:
+    """Connection state for /health."""
+    if not redis_enabled():
+        return {"status": "disabled"}
+
+    return {
+        "status": "ok" if _healthy else "unavailable",
+        "consecutive_failures": _consecutive_failures,
+        "last_error": _last_error,
+        "last_state_change": _last_state_change,
+    }
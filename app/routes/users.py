@@ -6,5 +6,5 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 
 @router.get("/me", response_model=UserOut)
-def me(user=Depends(get_current_user)):
+async def me(user=Depends(get_current_user)):
     return user
\ No newline at end of file
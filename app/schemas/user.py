@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import List, Optional
+
 from pydantic import BaseModel, EmailStr
 
 
@@ -20,6 +23,33 @@ class UserOut(BaseModel):
         from_attributes = True
 
 
+class SubscriptionSnapshot(BaseModel):
+    stripe_price_id: str
+    status: str
+    current_period_start: Optional[datetime] = None
+    current_period_end: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class AuthenticatedUser(BaseModel):
+    """
+    Cached view of the authenticated user (see app/auth/principal_cache.py).
+    Enough for auth, plan resolution and /users/me without an ORM load.
+    """
+
+    id: int
+    email: EmailStr
+    is_active: bool
+    is_pro: bool
+    stripe_customer_id: Optional[str] = None
+    subscriptions: List[SubscriptionSnapshot] = []
+
+    class Config:
+        from_attributes = True
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
\ No newline at end of file
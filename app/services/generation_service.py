@@ -0,0 +1,138 @@
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache_codecs import Codec
+from app.config import get_settings
+from app.db import AsyncSessionLocal
+from app.db_routing import note_user_write
+from app.model.generation import Generation
+
+settings = get_settings()
+
+# ===============================
+# Generation history
+# ===============================
+# Every chain result is stored (compressed) after the response is sent,
+# so reopening it is a DB read instead of another paid LLM run.
+#
+# Lists page by keyset on (user_id, created_at, id) — the cursor is the
+# last row's (created_at, id) — and never read the result column.
+
+# JSON for long-term stability; compressed whatever the size
+_codec = Codec(
+    serializer="json",
+    compression=settings.generation_compression,
+    compress_min_bytes=0,
+)
+
+PRODUCT_INFO_MAX = 512
+
+
+async def save_generation(
+    user_id: int, kind: str, product_info: str, result: dict
+) -> None:
+    """BackgroundTasks target: runs after the response has been sent."""
+    try:
+        generation = Generation(
+            user_id=user_id,
+            kind=kind,
+            product_info=product_info[:PRODUCT_INFO_MAX],
+            result=_codec.encode(result),
+        )
+        async with AsyncSessionLocal() as db:
+            db.add(generation)
+            await db.commit()
+        await note_user_write(user_id)
+    except Exception as e:
+        # History is best effort; the user already has the result
+        print("⚠️ Saving generation failed:", str(e))
+
+
+# -------------------------
+# Cursors
+# -------------------------
+def _encode_cursor(created_at: datetime, generation_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{generation_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError on a malformed cursor."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, generation_id = (
+        base64.urlsafe_b64decode(padded).decode().split("|", 1)
+    )
+    return datetime.fromisoformat(created_at), int(generation_id)
+
+
+# -------------------------
+# Reads
+# -------------------------
+async def list_generations(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: Optional[Tuple[datetime, int]] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Newest first. Returns (items, next_cursor); next_cursor None on the last page."""
+    stmt = (
+        select(
+            Generation.id,
+            Generation.kind,
+            Generation.product_info,
+            Generation.created_at,
+        )
+        .where(Generation.user_id == user_id)
+        .order_by(Generation.created_at.desc(), Generation.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(
+            tuple_(Generation.created_at, Generation.id) < tuple_(*cursor)
+        )
+
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    items = [
+        {
+            "id": row.id,
+            "kind": row.kind,
+            "product_info": row.product_info,
+            "created_at": row.created_at,
+        }
+        for row in rows
+    ]
+    return items, next_cursor
+
+
+async def get_generation(
+    db: AsyncSession, user_id: int, generation_id: int
+) -> Optional[dict]:
+    row = (
+        await db.execute(
+            select(Generation).where(
+                Generation.id == generation_id,
+                Generation.user_id == user_id,
+            )
+        )
+    ).scalar_one_or_none()
+
+    if row is None:
+        return None
+
+    return {
+        "id": row.id,
+        "kind": row.kind,
+        "product_info": row.product_info,
+        "created_at": row.created_at,
+        "result": _codec.decode(row.result),
+    }
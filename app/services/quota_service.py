@@ -0,0 +1,367 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, String, delete, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db import AsyncSessionLocal
+from app.db_routing import note_user_write
+from app.model.usage import Usage, UsageReservation
+from app.usage_buffer import (
+    buffered_commit,
+    buffered_release,
+    buffered_reserve,
+    note_fallback_increment,
+)
+from app.subscription_cache import invalidate_subscription_me
+
+settings = get_settings()
+
+# ===============================
+# Two-phase optimization quota
+# ===============================
+#   reserve  → hold one unit: used + reserved must stay under the limit
+#   commit   → the work succeeded: reserved - 1, used + 1
+#   release  → failed / timed out / cancelled: reserved - 1
+#   expire   → reservations nobody committed or released (crashed
+#              worker) are released by the reaper after
+#              quota_reservation_ttl_seconds
+#
+# Each step is one statement, so concurrent requests can't overrun the
+# limit and no DB session is held while the work runs.
+#
+# With usage_buffer_enabled the same steps run in Redis instead
+# (app/usage_buffer.py: reservations expire inside the reserve script,
+# commits are flushed to `usage` in batches). When Redis is unavailable
+# at reserve time the reservation is taken in Postgres as above.
+
+
+class QuotaReservation(NamedTuple):
+    token: str
+    usage_id: Optional[int]  # None for buffered reservations
+    user_id: int
+    period_start: datetime
+    period_end: datetime
+    buffered: bool = False
+
+
+def _limit_reached() -> HTTPException:
+    return HTTPException(
+        status_code=403,
+        detail="Monthly optimization limit reached",
+    )
+
+
+async def reserve_quota(
+    db: AsyncSession,
+    user_id: int,
+    limit,
+    period_start: datetime,
+    period_end: datetime,
+) -> QuotaReservation:
+    """
+    Hold one unit of the period's quota (limit may be "unlimited").
+    Raises 403 when used + reserved has reached the limit.
+
+        WITH reserved_usage AS (
+            INSERT INTO usage ... VALUES (..., reserved = 1)
+            ON CONFLICT (user_id, period_start, period_end)
+            DO UPDATE SET optimizations_reserved = optimizations_reserved + 1
+            WHERE optimizations_used + optimizations_reserved < :limit
+            RETURNING id
+        )
+        INSERT INTO usage_reservations SELECT :token, id, ... FROM reserved_usage
+    """
+    unlimited = limit == "unlimited"
+    if not unlimited and limit <= 0:
+        raise _limit_reached()
+
+    token = str(uuid.uuid4())
+    expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=settings.quota_reservation_ttl_seconds
+    )
+
+    held = func.coalesce(Usage.optimizations_used, 0) + Usage.optimizations_reserved
+
+    reserved_usage = (
+        pg_insert(Usage)
+        .values(
+            user_id=user_id,
+            optimizations_used=0,
+            optimizations_reserved=1,
+            period_start=period_start,
+            period_end=period_end,
+        )
+        .on_conflict_do_update(
+            constraint="uq_usage_user_period",
+            set_={
+                "optimizations_reserved": Usage.optimizations_reserved + 1,
+                "updated_at": func.now(),
+            },
+            where=None if unlimited else held < limit,
+        )
+        .returning(Usage.id)
+        .cte("reserved_usage")
+    )
+
+    stmt = (
+        insert(UsageReservation)
+        .from_select(
+            ["id", "usage_id", "user_id", "expires_at"],
+            select(
+                literal(token, String),
+                reserved_usage.c.id,
+                literal(user_id),
+                literal(expires_at, DateTime(timezone=True)),
+            ),
+        )
+        .returning(UsageReservation.usage_id)
+    )
+
+    usage_id = await db.scalar(stmt)
+    await db.commit()
+
+    if usage_id is None:
+        raise _limit_reached()
+
+    return QuotaReservation(
+        token=token,
+        usage_id=usage_id,
+        user_id=user_id,
+        period_start=period_start,
+        period_end=period_end,
+    )
+
+
+def _settle(token: str, **values):
+    """DELETE the reservation and apply `values` to its usage row, in one statement."""
+    settled = (
+        delete(UsageReservation)
+        .where(UsageReservation.id == token)
+        .returning(UsageReservation.usage_id)
+        .cte("settled")
+    )
+    return (
+        update(Usage)
+        .where(Usage.id == settled.c.usage_id)
+        .values(
+            optimizations_reserved=Usage.optimizations_reserved - 1,
+            updated_at=func.now(),
+            **values,
+        )
+        .returning(Usage.optimizations_used)
+    )
+
+
+async def commit_quota(db: AsyncSession, reservation: QuotaReservation) -> int:
+    """The work succeeded: turn the held unit into a used one. Returns the new count."""
+    used = await db.scalar(
+        _settle(
+            reservation.token,
+            optimizations_used=func.coalesce(Usage.optimizations_used, 0) + 1,
+        )
+    )
+
+    # Already expired and reaped: the work was still delivered, count it
+    if used is None:
+        used = await db.scalar(
+            update(Usage)
+            .where(Usage.id == reservation.usage_id)
+            .values(
+                optimizations_used=func.coalesce(Usage.optimizations_used, 0) + 1,
+                updated_at=func.now(),
+            )
+            .returning(Usage.optimizations_used)
+        )
+
+    await db.commit()
+    return used
+
+
+async def release_quota(db: AsyncSession, reservation: QuotaReservation) -> bool:
+    """Give the unit back. False if it had already expired."""
+    result = await db.execute(_settle(reservation.token))
+    await db.commit()
+    return result.first() is not None
+
+
+async def expire_reservations(db: AsyncSession) -> int:
+    """Release every reservation past its expiry. Returns how many."""
+    expired = (
+        delete(UsageReservation)
+        .where(UsageReservation.expires_at < func.now())
+        .returning(UsageReservation.usage_id)
+        .cte("expired")
+    )
+    per_usage = (
+        select(expired.c.usage_id, func.count().label("n"))
+        .group_by(expired.c.usage_id)
+        .cte("expired_per_usage")
+    )
+    result = await db.execute(
+        update(Usage)
+        .where(Usage.id == per_usage.c.usage_id)
+        .values(optimizations_reserved=Usage.optimizations_reserved - per_usage.c.n)
+        .returning(per_usage.c.n)
+    )
+    released = sum(n for (n,) in result)
+    await db.commit()
+    return released
+
+
+async def run_reservation_reaper() -> None:
+    """Periodic expire_reservations; started from the app lifespan."""
+    while True:
+        await asyncio.sleep(settings.quota_reaper_interval_seconds)
+        try:
+            async with AsyncSessionLocal() as db:
+                released = await expire_reservations(db)
+            if released:
+                print(f"⚠️ Released {released} abandoned quota reservation(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("⚠️ Quota reservation reaper failed:", str(e))
+
+
+# -------------------------
+# Session-owning helpers (endpoint use)
+# -------------------------
+# Each opens and closes its own short session, so the caller holds no
+# connection between reserve and commit/release. Usage reads by the same
+# user stay on the primary afterwards (app/db_routing.py).
+async def reserve(user_id: int, limit, period_start, period_end) -> QuotaReservation:
+    if settings.usage_buffer_enabled:
+        reservation = await _reserve_buffered(
+            user_id, limit, period_start, period_end
+        )
+        if reservation is not None:
+            return reservation
+
+    async with AsyncSessionLocal() as db:
+        reservation = await reserve_quota(
+            db, user_id, limit, period_start, period_end
+        )
+    await note_user_write(user_id)
+    return reservation
+
+
+async def commit(reservation: QuotaReservation) -> int:
+    used = None
+    if reservation.buffered:
+        used = await buffered_commit(
+            reservation.user_id,
+            reservation.period_start,
+            reservation.period_end,
+            reservation.token,
+        )
+        if used is None:
+            # Redis went away during the run: count it in Postgres
+            counted_at = time.time()
+            used = await _count_in_postgres(reservation)
+            note_fallback_increment(
+                reservation.user_id,
+                reservation.period_start,
+                reservation.period_end,
+                counted_at,
+            )
+    else:
+        counted_at = time.time()
+        async with AsyncSessionLocal() as db:
+            used = await commit_quota(db, reservation)
+        if settings.usage_buffer_enabled:
+            # Reserved in Postgres because Redis was unavailable
+            note_fallback_increment(
+                reservation.user_id,
+                reservation.period_start,
+                reservation.period_end,
+                counted_at,
+            )
+
+    await note_user_write(reservation.user_id)
+    await invalidate_subscription_me(reservation.user_id)
+    return used
+
+
+async def release(reservation: QuotaReservation) -> None:
+    if reservation.buffered:
+        # Expires on its own if this fails
+        await buffered_release(
+            reservation.user_id,
+            reservation.period_start,
+            reservation.period_end,
+            reservation.token,
+        )
+        return
+
+    try:
+        async with AsyncSessionLocal() as db:
+            await release_quota(db, reservation)
+        await note_user_write(reservation.user_id)
+    except Exception as e:
+        # The reaper will release it on expiry
+        print("⚠️ Quota release failed:", str(e))
+
+
+# -------------------------
+# Buffered (Redis) reservations
+# -------------------------
+async def _reserve_buffered(
+    user_id: int, limit, period_start, period_end
+) -> Optional[QuotaReservation]:
+    """None → Redis unavailable, reserve in Postgres instead."""
+    if limit != "unlimited" and limit <= 0:
+        raise _limit_reached()
+
+    token = str(uuid.uuid4())
+    allowed = await buffered_reserve(
+        user_id,
+        limit,
+        period_start,
+        period_end,
+        token,
+        expires_at=time.time() + settings.quota_reservation_ttl_seconds,
+    )
+    if allowed is None:
+        return None
+    if not allowed:
+        raise _limit_reached()
+
+    return QuotaReservation(
+        token=token,
+        usage_id=None,
+        user_id=user_id,
+        period_start=period_start,
+        period_end=period_end,
+        buffered=True,
+    )
+
+
+async def _count_in_postgres(reservation: QuotaReservation) -> int:
+    """Count a delivered unit directly in `usage` (no limit check)."""
+    stmt = pg_insert(Usage).values(
+        user_id=reservation.user_id,
+        optimizations_used=1,
+        period_start=reservation.period_start,
+        period_end=reservation.period_end,
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_usage_user_period",
+        set_={
+            "optimizations_used": (
+                func.coalesce(Usage.optimizations_used, 0) + 1
+            ),
+            "updated_at": func.now(),
+        },
+    ).returning(Usage.optimizations_used)
+
+    async with AsyncSessionLocal() as db:
+        used = await db.scalar(stmt)
+        await db.commit()
+    return used
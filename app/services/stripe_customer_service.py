@@ -0,0 +1,251 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+import stripe
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.auth.principal_cache import invalidate_principal
+from app.config import get_settings
+from app.db import SessionLocal
+from app.db_routing import note_user_write
+from app.model.outbox import OutboxEvent
+from app.model.user import User
+
+settings = get_settings()
+stripe.api_key = settings.stripe_secret_key
+
+# ===============================
+# Stripe customers (transactional outbox)
+# ===============================
+# Registration never calls Stripe. It commits the user together with a
+# "stripe.customer.create" outbox event; the worker below leases due
+# events in batches (FOR UPDATE SKIP LOCKED, so several app instances can
+# run it), calls Stripe with no transaction open, and retries failures
+# with exponential backoff.
+#
+# Every Customer.create uses the same idempotency key and the same
+# parameters per user, so the worker and the lazy path in billing can
+# race without creating two customers (Stripe rejects a reused key whose
+# parameters differ).
+
+CUSTOMER_CREATE_EVENT = "stripe.customer.create"
+
+
+def _idempotency_key(user_id: int) -> str:
+    return f"customer-create-{user_id}"
+
+
+def enqueue_customer_creation(db, user: User) -> None:
+    """
+    Add the outbox event (sync or async session). The user must already
+    be flushed; the caller commits both together.
+    """
+    db.add(
+        OutboxEvent(
+            user_id=user.id,
+            event_type=CUSTOMER_CREATE_EVENT,
+            payload={"email": user.email},
+        )
+    )
+
+
+def _create_customer(user_id: int, email: str) -> str:
+    # Parameters must not depend on the caller (see above)
+    customer = stripe.Customer.create(
+        email=email,
+        metadata={"user_id": str(user_id)},
+        idempotency_key=_idempotency_key(user_id),
+    )
+    return customer.id
+
+
+def _mark_done(db: Session, user_id: int) -> None:
+    now = datetime.now(timezone.utc)
+    db.query(OutboxEvent).filter(
+        OutboxEvent.user_id == user_id,
+        OutboxEvent.event_type == CUSTOMER_CREATE_EVENT,
+        OutboxEvent.status != "done",
+    ).update(
+        {OutboxEvent.status: "done", OutboxEvent.processed_at: now},
+        synchronize_session=False,
+    )
+
+
+# -------------------------
+# Lazy path (checkout)
+# -------------------------
+def ensure_stripe_customer(user_id: int) -> str:
+    """
+    Stripe customer id for the user, creating it now if the outbox
+    hasn't yet. Blocking: call via run_in_threadpool.
+    """
+    with SessionLocal() as db:
+        user = db.get(User, user_id)
+        if user is None:
+            raise ValueError(f"Unknown user {user_id}")
+
+        if user.stripe_customer_id:
+            return user.stripe_customer_id
+
+    # No pooled connection held during the Stripe call
+    customer_id = _create_customer(user.id, user.email)
+
+    with SessionLocal() as db:
+        db.query(User).filter(
+            User.id == user_id,
+            User.stripe_customer_id.is_(None),
+        ).update(
+            {User.stripe_customer_id: customer_id},
+            synchronize_session=False,
+        )
+        _mark_done(db, user_id)
+        db.commit()
+
+    return customer_id
+
+
+# -------------------------
+# Worker
+# -------------------------
+def _backoff(attempts: int) -> timedelta:
+    seconds = min(2 ** attempts, settings.stripe_outbox_max_backoff_seconds)
+    return timedelta(seconds=seconds)
+
+
+class _Claimed(NamedTuple):
+    event_id: int
+    user_id: int
+    email: str
+
+
+def _claim_events(batch_size: int) -> List[_Claimed]:
+    """
+    Lease due events: push next_attempt_at past the lease and commit, so
+    no row lock is held while Stripe is called. A worker that dies
+    mid-batch leaves its events to be retried when the lease runs out.
+    """
+    with SessionLocal() as db:
+        now = datetime.now(timezone.utc)
+        events = (
+            db.query(OutboxEvent)
+            .filter(
+                OutboxEvent.event_type == CUSTOMER_CREATE_EVENT,
+                OutboxEvent.status == "pending",
+                OutboxEvent.next_attempt_at <= now,
+            )
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+        claimed: List[_Claimed] = []
+        for event in events:
+            user = db.get(User, event.user_id)
+
+            # Deleted, or already created via the lazy path
+            if user is None or user.stripe_customer_id:
+                event.status = "done"
+                event.processed_at = now
+                continue
+
+            event.next_attempt_at = now + timedelta(
+                seconds=settings.stripe_outbox_lease_seconds
+            )
+            claimed.append(_Claimed(event.id, user.id, user.email))
+
+        db.commit()
+        return claimed
+
+
+# (event, customer id, error) per claimed event
+_Result = Tuple[_Claimed, Optional[str], Optional[Exception]]
+
+
+def _record_results(results: List[_Result]) -> List[int]:
+    """Store customer ids / failures for a leased batch, in one short transaction."""
+    updated: List[int] = []
+    with SessionLocal() as db:
+        now = datetime.now(timezone.utc)
+        for claimed, customer_id, error in results:
+            event = db.get(OutboxEvent, claimed.event_id)
+            if event is None or event.status != "pending":
+                continue
+
+            if error is not None:
+                event.attempts += 1
+                event.last_error = str(error)[:500]
+                if event.attempts >= settings.stripe_outbox_max_attempts:
+                    event.status = "failed"
+                    print(
+                        f"⚠️ Stripe customer creation failed for user "
+                        f"{claimed.user_id} after {event.attempts} attempts:",
+                        str(error),
+                    )
+                else:
+                    event.next_attempt_at = now + _backoff(event.attempts)
+                continue
+
+            db.query(User).filter(
+                User.id == claimed.user_id,
+                User.stripe_customer_id.is_(None),
+            ).update(
+                {User.stripe_customer_id: customer_id},
+                synchronize_session=False,
+            )
+            event.status = "done"
+            event.processed_at = now
+            updated.append(claimed.user_id)
+
+        db.commit()
+    return updated
+
+
+def process_customer_outbox(batch_size: int) -> Tuple[int, List[int]]:
+    """
+    Handle one batch of due events: claim (short transaction), call
+    Stripe with no transaction open, record (short transaction).
+    Returns (events claimed, ids of users whose stripe_customer_id was
+    set — their cached principal is stale).
+    """
+    claimed = _claim_events(batch_size)
+
+    results: List[_Result] = []
+    for event in claimed:
+        try:
+            customer_id = _create_customer(event.user_id, event.email)
+            results.append((event, customer_id, None))
+        except Exception as e:
+            results.append((event, None, e))
+
+    if not results:
+        return len(claimed), []
+    return len(claimed), _record_results(results)
+
+
+async def run_stripe_outbox_worker() -> None:
+    """Drain the customer outbox; started from the app lifespan."""
+    if not settings.stripe_secret_key:
+        return
+
+    batch_size = settings.stripe_outbox_batch_size
+
+    while True:
+        try:
+            claimed, updated = await run_in_threadpool(
+                process_customer_outbox, batch_size
+            )
+            for user_id in updated:
+                await note_user_write(user_id)
+                await invalidate_principal(user_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("⚠️ Stripe outbox batch failed:", str(e))
+            claimed = 0
+
+        # Full batch → probably more waiting, go again right away
+        if claimed < batch_size:
+            await asyncio.sleep(settings.stripe_outbox_poll_seconds)
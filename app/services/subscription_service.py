@@ -1,8 +1,9 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.plans import PLAN_CONFIG, FREE_PLAN
 from app.model.subscription import Subscription
@@ -11,17 +12,18 @@ from app.model.subscription import Subscription
 ACTIVE_STATUSES = {"active", "trialing"}
 
 
-def get_active_subscriptions(db: Session, user_id: int) -> List[Subscription]:
+async def get_active_subscriptions(
+    db: AsyncSession, user_id: int
+) -> List[Subscription]:
     """Return all currently active subscriptions for a user."""
-    return (
-        db.query(Subscription)
-        .filter(
+    result = await db.scalars(
+        select(Subscription).where(
             Subscription.user_id == user_id,
             Subscription.status.in_(ACTIVE_STATUSES),
             Subscription.current_period_end > datetime.now(timezone.utc),
         )
-        .all()
     )
+    return list(result.all())
 
 
 def resolve_user_plan(subscriptions: List[Subscription]) -> dict:
@@ -32,7 +34,7 @@ def resolve_user_plan(subscriptions: List[Subscription]) -> dict:
     if not subscriptions:
         return FREE_PLAN
 
-    price_ids = {s.price_id for s in subscriptions}
+    price_ids = {s.stripe_price_id for s in subscriptions}
 
     # Highest → lowest priority
     if "price_growth_monthly" in price_ids:
@@ -44,6 +46,40 @@ def resolve_user_plan(subscriptions: List[Subscription]) -> dict:
     return FREE_PLAN
 
 
+def _loaded_active_subscriptions(user) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        s
+        for s in user.subscriptions
+        if s.status in ACTIVE_STATUSES
+        and s.current_period_end is not None
+        and s.current_period_end > now
+    ]
+
+
+def resolve_plan_for_user(user) -> dict:
+    """
+    Resolve the plan from the user's already-loaded subscriptions
+    (User.subscriptions is selectin-loaded), without another query.
+    """
+    return resolve_user_plan(_loaded_active_subscriptions(user))
+
+
+def resolve_plan_and_period(user) -> Tuple[dict, Optional[datetime], Optional[datetime]]:
+    """
+    Like resolve_plan_for_user, plus the billing period of the
+    subscription that grants the plan (None for the free plan).
+    """
+    active = _loaded_active_subscriptions(user)
+    plan = resolve_user_plan(active)
+
+    for sub in active:
+        if PLAN_CONFIG.get(sub.stripe_price_id) is plan:
+            return plan, sub.current_period_start, sub.current_period_end
+
+    return plan, None, None
+
+
 # ----------------------------
 # Feature guards
 # ----------------------------
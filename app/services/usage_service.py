@@ -1,96 +1,88 @@
-from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
 
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
 from app.model.usage import Usage
+from app.usage_buffer import buffered_usage
+
+settings = get_settings()
+
+
+# ------------------------------------------------
+# Billing period for metering
+# ------------------------------------------------
+def usage_period(period_start, period_end):
+    """
+    The subscription's billing period, or the current calendar month
+    (UTC) for users without one (free plan).
+    """
+    if period_start is not None and period_end is not None:
+        return period_start, period_end
+
+    now = datetime.now(timezone.utc)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
 
 
 # ------------------------------------------------
 # Get or create usage row for a billing period
 # ------------------------------------------------
-def get_or_create_usage(
-    db: Session,
+async def get_or_create_usage(
+    db: AsyncSession,
     user_id: int,
     period_start,
     period_end,
 ) -> Usage:
-    usage = (
-        db.query(Usage)
-        .filter(
+    # ON CONFLICT DO NOTHING: concurrent callers can't create duplicates
+    await db.execute(
+        pg_insert(Usage)
+        .values(
+            user_id=user_id,
+            optimizations_used=0,
+            period_start=period_start,
+            period_end=period_end,
+        )
+        .on_conflict_do_nothing(constraint="uq_usage_user_period")
+    )
+    await db.commit()
+
+    return await db.scalar(
+        select(Usage).where(
             Usage.user_id == user_id,
             Usage.period_start == period_start,
             Usage.period_end == period_end,
         )
-        .first()
-    )
-
-    if usage:
-        return usage
-
-    usage = Usage(
-        user_id=user_id,
-        optimizations_used=0,
-        period_start=period_start,
-        period_end=period_end,
     )
 
-    db.add(usage)
-    db.commit()
-    db.refresh(usage)
-
-    return usage
-
 
 # ------------------------------------------------
 # Read usage (used count only)
 # Used by /subscription/me
 # ------------------------------------------------
-def get_usage_for_period(
-    db: Session,
+async def get_usage_for_period(
+    db: AsyncSession,
     user_id: int,
     period_start,
     period_end,
 ):
-    usage = (
-        db.query(Usage)
-        .filter(
+    if settings.usage_buffer_enabled:
+        buffered = await buffered_usage(user_id, period_start, period_end)
+        if buffered is not None:
+            return {"used": buffered}
+
+    used = await db.scalar(
+        select(Usage.optimizations_used).where(
             Usage.user_id == user_id,
             Usage.period_start == period_start,
             Usage.period_end == period_end,
         )
-        .first()
     )
 
-    if not usage:
-        return {"used": 0}
-
-    return {"used": usage.optimizations_used}
-
-
-# ------------------------------------------------
-# Increment usage (called when optimization runs)
-# ------------------------------------------------
-def increment_optimization_usage(
-    db: Session,
-    user_id: int,
-    plan: dict,
-    period_start,
-    period_end,
-):
-    usage = get_or_create_usage(
-        db=db,
-        user_id=user_id,
-        period_start=period_start,
-        period_end=period_end,
-    )
-
-    limit = plan["limits"]["optimizations_per_period"]
-
-    # Unlimited plan
-    if limit != "unlimited" and usage.optimizations_used >= limit:
-        raise HTTPException(
-            status_code=403,
-            detail="Optimization limit reached. Upgrade your plan.",
-        )
-
-    usage.optimizations_used += 1
-    db.commit()
+    return {"used": used or 0}
@@ -0,0 +1,36 @@
+from typing import Optional
+
+from app.config import get_settings
+from app.tiered_cache import TieredCache
+
+settings = get_settings()
+
+# Rendered /subscription/me responses ({"etag", "body"}) per user, for
+# the frontend's polling. Optional (subscription_me_cache_ttl_seconds).
+# Invalidated by the Stripe webhook and by usage writes; the short TTL
+# bounds anything a racing request re-caches.
+subscription_me_cache = (
+    TieredCache(
+        namespace="subme",
+        ttl=settings.subscription_me_cache_ttl_seconds,
+        l1_ttl=settings.subscription_me_cache_ttl_seconds,
+    )
+    if settings.subscription_me_cache_ttl_seconds > 0
+    else None
+)
+
+
+async def get_cached_subscription_me(user_id: int | str) -> Optional[dict]:
+    if subscription_me_cache is None:
+        return None
+    return await subscription_me_cache.get(str(user_id))
+
+
+async def cache_subscription_me(user_id: int | str, response: dict) -> None:
+    if subscription_me_cache is not None:
+        await subscription_me_cache.set(str(user_id), response)
+
+
+async def invalidate_subscription_me(user_id: int | str) -> None:
+    if subscription_me_cache is not None:
+        await subscription_me_cache.invalidate(str(user_id))
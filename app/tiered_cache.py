@@ -0,0 +1,326 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.cache_codecs import Codec, default_codec
+from app.config import get_settings
+from app.memory_cache import LRUCache
+from app.redis_client import get_redis, redis_enabled, report_redis_error
+
+settings = get_settings()
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Compare-and-delete: release the refresh lock only if we still own it
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Lets a worker ignore its own invalidation broadcasts
+_WORKER_ID = uuid.uuid4().hex
+
+# L1 marker for a key known to be missing from L2 (l1_miss_ttl)
+_MISS = object()
+
+# namespace -> cache, so the pub/sub listener can find L1 stores
+_registry: Dict[str, "TieredCache"] = {}
+
+
+class TieredCache:
+    """
+    Two-tier cache: a small in-process L1 (LRUCache) in front of Redis L2.
+
+    - get(): L1 → L2 → None. L2 hits are promoted into L1.
+    - set(): write-through to L2 and L1, then broadcast an invalidation
+      so other workers drop their stale L1 copy.
+    - invalidate(): delete from L2 and L1 everywhere.
+    - get_or_load(): read-through with stale-while-revalidate.
+
+    `ttl` is the hard TTL: entries disappear after it. With `soft_ttl`
+    set, entries older than it are still served, but trigger a single
+    background refresh (guarded by a Redis lock across workers).
+
+    L1 entries live for at most `l1_ttl` seconds while Redis is healthy,
+    which bounds staleness if an invalidation message is ever missed.
+    When Redis is down, L1 is the only tier and keeps the full TTL.
+
+    With `l1_miss_ttl` set, L2 misses are remembered in L1 for that long,
+    so keys that are usually absent don't cost a Redis GET per lookup.
+    set() and invalidate() clear them on every worker like any L1 entry.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int,
+        soft_ttl: Optional[int] = None,
+        l1_ttl: Optional[int] = None,
+        l1_max_entries: Optional[int] = None,
+        codec: Optional[Codec] = None,
+        l1_miss_ttl: Optional[int] = None,
+    ):
+        if ":" in namespace:
+            raise ValueError("Cache namespace must not contain ':'")
+
+        self.namespace = namespace
+        self.ttl = ttl
+        self.soft_ttl = soft_ttl
+        self.l1_ttl = l1_ttl or settings.l1_cache_ttl_seconds
+        self.l1_miss_ttl = l1_miss_ttl
+        self.codec = codec or default_codec()
+
+        # L1 holds (stored_at, value) so age survives promotion from L2
+        self.l1 = LRUCache(
+            max_entries=l1_max_entries or settings.memory_cache_max_entries,
+            max_bytes=settings.memory_cache_max_bytes,
+            default_ttl=ttl,
+        )
+
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+        _registry[namespace] = self
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"lock:{self.namespace}:{key}"
+
+    async def _publish_invalidation(self, key: str) -> None:
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.publish(
+                INVALIDATION_CHANNEL, f"{_WORKER_ID} {self._redis_key(key)}"
+            )
+        except Exception as e:
+            report_redis_error(e)
+
+    # -------------------------
+    # Entries (value + age)
+    # -------------------------
+    async def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, age_seconds) or None."""
+        entry = self.l1.get(key)
+
+        if entry is None:
+            redis = get_redis(binary=True)
+            if redis is None:
+                return None
+
+            try:
+                raw = await redis.get(self._redis_key(key))
+            except Exception as e:
+                report_redis_error(e)
+                return None
+
+            if raw is None:
+                if self.l1_miss_ttl:
+                    self.l1.set(key, _MISS, ttl=self.l1_miss_ttl, size=0)
+                return None
+
+            try:
+                envelope = self.codec.decode(raw)
+            except Exception:
+                return None
+
+            if isinstance(envelope, dict) and envelope.keys() == {"t", "v"}:
+                entry = (envelope["t"], envelope["v"])
+            else:
+                # Written before envelopes: age unknown, treat as stale
+                entry = (0.0, envelope)
+
+            # Sized as decoded (what L1 holds), not as the compressed bytes
+            self.l1.set(key, entry, ttl=self.l1_ttl)
+
+        elif entry is _MISS:
+            return None
+
+        stored_at, value = entry
+        return value, time.time() - stored_at
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = await self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key: str, value: Any) -> None:
+        redis = get_redis(binary=True)
+        stored_at = time.time()
+        payload = self.codec.encode({"t": stored_at, "v": value})
+        stored_in_l2 = False
+
+        if redis is not None:
+            try:
+                await redis.set(self._redis_key(key), payload, ex=self.ttl)
+                stored_in_l2 = True
+            except Exception as e:
+                # fail silently → L1 only
+                report_redis_error(e)
+
+        self.l1.set(
+            key,
+            (stored_at, value),
+            ttl=self.l1_ttl if stored_in_l2 else self.ttl,
+        )
+
+        if stored_in_l2:
+            await self._publish_invalidation(key)
+
+    async def invalidate(self, key: str) -> None:
+        self.l1.delete(key)
+
+        redis = get_redis(binary=True)
+        if redis is not None:
+            try:
+                await redis.delete(self._redis_key(key))
+            except Exception as e:
+                report_redis_error(e)
+
+        await self._publish_invalidation(key)
+
+    # -------------------------
+    # Read-through + SWR
+    # -------------------------
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return the cached value, loading and storing it on a miss.
+        Soft-expired values are returned immediately and refreshed
+        in the background; hard-expired values are simply missing.
+        """
+        entry = await self.get_entry(key)
+
+        if entry is not None:
+            value, age = entry
+            if self.soft_ttl is not None and age >= self.soft_ttl:
+                await self._schedule_refresh(key, loader)
+            return value
+
+        value = await loader()
+        if value is not None:
+            await self.set(key, value)
+        return value
+
+    async def _acquire_refresh_lock(self, key: str) -> Optional[str]:
+        """
+        Token of the lock we now hold, "" when Redis can't coordinate
+        (refresh anyway, nothing to release), or None if another worker
+        holds it.
+        """
+        redis = get_redis()
+        if redis is None:
+            return ""
+
+        token = uuid.uuid4().hex
+        try:
+            ttl = max(self.ttl - (self.soft_ttl or 0), 1)
+            lock_ttl = min(settings.cache_refresh_lock_seconds, ttl)
+            acquired = await redis.set(self._lock_key(key), token, nx=True, ex=lock_ttl)
+            return token if acquired else None
+        except Exception as e:
+            # Can't coordinate → still refresh; worst case a duplicate call
+            report_redis_error(e)
+            return ""
+
+    async def _release_refresh_lock(self, key: str, token: str) -> None:
+        # Only our own lock: after a slow refresh it may have expired and
+        # been taken by another worker
+        redis = get_redis()
+        if redis is None or not token:
+            return
+        try:
+            await redis.eval(RELEASE_LOCK_LUA, 1, self._lock_key(key), token)
+        except Exception:
+            pass
+
+    async def _schedule_refresh(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> None:
+        # One refresh per key per worker, one per key across workers
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        token = await self._acquire_refresh_lock(key)
+        if token is None:
+            self._refreshing.discard(key)
+            return
+
+        async def refresh() -> None:
+            try:
+                value = await loader()
+                if value is not None:
+                    await self.set(key, value)
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {self._redis_key(key)} ({e})")
+            finally:
+                self._refreshing.discard(key)
+                await self._release_refresh_lock(key, token)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+# ===============================
+# Pub/sub invalidation listener
+# ===============================
+def _drop_local(message: str) -> None:
+    origin, _, full_key = message.partition(" ")
+    if origin == _WORKER_ID:
+        return
+
+    namespace, _, key = full_key.partition(":")
+    cache = _registry.get(namespace)
+    if cache is not None:
+        cache.l1.delete(key)
+
+
+async def run_invalidation_listener() -> None:
+    """
+    Drop L1 entries when any worker writes or invalidates a key.
+    Runs for the lifetime of the worker; reconnects after errors.
+    """
+    if not redis_enabled():
+        return
+
+    while True:
+        redis = get_redis()
+        if redis is None:
+            # Circuit open: L1 is the only tier, nothing to listen for
+            await asyncio.sleep(settings.redis_probe_min_backoff_seconds)
+            continue
+
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _drop_local(message["data"])
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            print(f"⚠️ Cache invalidation listener error ({e}), retrying")
+            # Anything cached locally may have missed an invalidation
+            for cache in _registry.values():
+                cache.l1.clear()
+            await asyncio.sleep(1)
+
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,523 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import get_settings
+from app.db import AsyncSessionLocal
+from app.model.usage import Usage
+from app.redis_client import get_redis, report_redis_error
+
+settings = get_settings()
+
+# ===============================
+# Redis-buffered usage metering
+# ===============================
+# Optional (usage_buffer_enabled). Quota reservations, commits and limit
+# checks (app/services/quota_service.py) happen in Redis; a background
+# flusher writes the accumulated deltas to `usage` in batched UPSERTs.
+#
+# One hash per (user, billing period):
+#   used      total count (seeded from Postgres on first touch)
+#   pending   increments not yet claimed by a flush
+#   inflight  increments claimed by the current flush
+#   seq       sequence number of that flush
+#   seeded_at when `used` was read from Postgres (fallback reconciliation)
+#   user_id, ps, pe   to rebuild the usage row
+# plus a set of hashes with unflushed increments, and a sorted set of
+# live quota reservations per hash (/optimize, see quota_service).
+#
+# Exactly-once flushing:
+#   1. claim: pending → inflight and seq += 1, atomically. An unacked
+#      inflight (flusher crashed) is retried with the same seq.
+#   2. upsert: add inflight to the row only WHERE usage.flush_seq < seq,
+#      and store seq. Replaying an applied flush is a no-op.
+#   3. ack: inflight = 0 once the transaction has committed.
+# A crash between any two steps neither loses nor double-counts. Redis
+# itself must persist (AOF) for unflushed increments to survive a Redis
+# restart. This covers the buffered increments only; fallback increments
+# below are counted in Postgres exactly once, but their catch-up in Redis
+# is best effort.
+#
+# When Redis is unavailable, quota_service meters in Postgres directly
+# and records when it did with note_fallback_increment. The flusher adds
+# those to the existing hash's count once Redis is back, so the limit
+# stays enforced for the rest of the period. Increments recorded before
+# the hash was (re)seeded are already in the seeded count and are
+# skipped. The record lives in the worker's memory: if the worker
+# restarts first, those hashes under-count until they expire and are
+# re-seeded from Postgres. Timestamps come from the workers' clocks,
+# which are assumed NTP-synced.
+
+DIRTY_KEY = "usage:dirty"
+
+
+# KEYS[1] = usage hash
+# ARGV    = used, seq, user_id, period_start, period_end, ttl_seconds,
+#           seeded_at
+SEED_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1],
+        'used', ARGV[1], 'pending', 0, 'inflight', 0, 'seq', ARGV[2],
+        'user_id', ARGV[3], 'ps', ARGV[4], 'pe', ARGV[5],
+        'seeded_at', ARGV[7])
+    redis.call('EXPIRE', KEYS[1], ARGV[6])
+end
+return 1
+"""
+
+# KEYS[1] = dirty set
+# ARGV    = max keys
+# Returns flat [key, inflight, seq, user_id, ps, pe, ...]
+CLAIM_LUA = """
+local out = {}
+for _, key in ipairs(redis.call('SRANDMEMBER', KEYS[1], ARGV[1])) do
+    if redis.call('EXISTS', key) == 0 then
+        redis.call('SREM', KEYS[1], key)
+    else
+        local inflight = tonumber(redis.call('HGET', key, 'inflight'))
+        if inflight == 0 then
+            inflight = tonumber(redis.call('HGET', key, 'pending'))
+            if inflight > 0 then
+                redis.call('HSET', key, 'inflight', inflight, 'pending', 0)
+                redis.call('HINCRBY', key, 'seq', 1)
+            else
+                redis.call('SREM', KEYS[1], key)
+            end
+        end
+        if inflight > 0 then
+            local f = redis.call('HMGET', key, 'seq', 'user_id', 'ps', 'pe')
+            table.insert(out, key)
+            table.insert(out, inflight)
+            table.insert(out, f[1])
+            table.insert(out, f[2])
+            table.insert(out, f[3])
+            table.insert(out, f[4])
+        end
+    end
+end
+return out
+"""
+
+# KEYS[1] = dirty set
+# ARGV    = flat [key, seq, ...]
+ACK_LUA = """
+for i = 1, #ARGV, 2 do
+    local key = ARGV[i]
+    if redis.call('HGET', key, 'seq') == ARGV[i + 1] then
+        redis.call('HSET', key, 'inflight', 0)
+        if tonumber(redis.call('HGET', key, 'pending')) == 0 then
+            redis.call('SREM', KEYS[1], key)
+        end
+    end
+end
+return 1
+"""
+
+# Quota reservations (app/services/quota_service.py): one sorted set per
+# usage hash, token -> expiry. Expired tokens are dropped on the next
+# reserve, so a crashed worker's hold disappears without a reaper.
+
+# KEYS[1] = usage hash, KEYS[2] = reservation set
+# ARGV    = limit (-1 = unlimited), token, now, expires_at, ttl_seconds
+# Returns the current count, -1 if the limit is reached, -2 if not seeded
+RESERVE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+
+local used = tonumber(redis.call('HGET', KEYS[1], 'used'))
+local limit = tonumber(ARGV[1])
+if limit >= 0 and used + redis.call('ZCARD', KEYS[2]) >= limit then
+    return -1
+end
+
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return used
+"""
+
+# KEYS[1] = usage hash, KEYS[2] = reservation set, KEYS[3] = dirty set
+# ARGV    = token, ttl_seconds
+# Counts even if the reservation expired: the work was delivered.
+# Returns the new count, -2 if not seeded
+COMMIT_LUA = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+
+local used = redis.call('HINCRBY', KEYS[1], 'used', 1)
+redis.call('HINCRBY', KEYS[1], 'pending', 1)
+redis.call('SADD', KEYS[3], KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return used
+"""
+
+# KEYS[1] = usage hash
+# ARGV    = start times of increments metered in Postgres while Redis
+#           was unreachable
+# Only increments that started after the hash's seed read are added; the
+# seed already counted the rest. A missing hash will be seeded from
+# Postgres, which has them all. Returns the number added.
+ADJUST_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+
+local seeded_at = tonumber(redis.call('HGET', KEYS[1], 'seeded_at') or '0')
+local missing = 0
+for _, counted_at in ipairs(ARGV) do
+    if tonumber(counted_at) > seeded_at then
+        missing = missing + 1
+    end
+end
+if missing > 0 then
+    redis.call('HINCRBY', KEYS[1], 'used', missing)
+end
+return missing
+"""
+
+_scripts: Dict[str, object] = {}
+_scripts_client = None
+
+
+def _script(redis, source: str):
+    global _scripts, _scripts_client
+
+    if _scripts_client is not redis:
+        _scripts = {}
+        _scripts_client = redis
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = redis.register_script(source)
+    return script
+
+
+def _usage_key(user_id: int, period_start: datetime, period_end: datetime) -> str:
+    return (
+        f"usage:{user_id}:{period_start.timestamp():.0f}:"
+        f"{period_end.timestamp():.0f}"
+    )
+
+
+def _reservations_key(usage_key: str) -> str:
+    return f"{usage_key}:res"
+
+
+async def _stored_usage(user_id: int, period_start, period_end):
+    """(count, flush_seq) persisted in Postgres, for seeding Redis."""
+    async with AsyncSessionLocal() as db:
+        row = (
+            await db.execute(
+                select(Usage.optimizations_used, Usage.flush_seq).where(
+                    Usage.user_id == user_id,
+                    Usage.period_start == period_start,
+                    Usage.period_end == period_end,
+                )
+            )
+        ).first()
+
+    return (row[0] or 0, row[1]) if row else (0, 0)
+
+
+async def _seed(redis, key: str, user_id: int, period_start, period_end) -> None:
+    """Create the hash from the Postgres row (no-op if it already exists)."""
+    used, seq = await _stored_usage(user_id, period_start, period_end)
+    # After the read: an increment that started earlier may be in `used`,
+    # so reconciliation must not add it again
+    seeded_at = time.time()
+    await _script(redis, SEED_LUA)(
+        keys=[key],
+        args=[
+            used,
+            seq,
+            user_id,
+            period_start.isoformat(),
+            period_end.isoformat(),
+            settings.usage_buffer_key_ttl_seconds,
+            seeded_at,
+        ],
+    )
+
+
+async def _run_seeded(
+    redis,
+    source: str,
+    keys: List[str],
+    args: List,
+    user_id: int,
+    period_start,
+    period_end,
+):
+    """
+    Run a script that returns -2 when the usage hash doesn't exist yet
+    (first touch this period, or expired); seed and retry once.
+    Raises on Redis errors.
+    """
+    script = _script(redis, source)
+    result = await script(keys=keys, args=args)
+    if result == -2:
+        # keys[0] is always the usage hash
+        await _seed(redis, keys[0], user_id, period_start, period_end)
+        result = await script(keys=keys, args=args)
+    return result
+
+
+async def buffered_reserve(
+    user_id: int,
+    limit,
+    period_start: datetime,
+    period_end: datetime,
+    token: str,
+    expires_at: float,
+) -> Optional[bool]:
+    """
+    Hold one unit in Redis: count + live reservations must stay under
+    the limit. False → limit reached, None → Redis unavailable.
+    """
+    redis = get_redis()
+    if redis is None:
+        return None
+
+    key = _usage_key(user_id, period_start, period_end)
+    args = [
+        -1 if limit == "unlimited" else limit,
+        token,
+        time.time(),
+        expires_at,
+        settings.usage_buffer_key_ttl_seconds,
+    ]
+
+    try:
+        result = await _run_seeded(
+            redis, RESERVE_LUA, [key, _reservations_key(key)], args,
+            user_id, period_start, period_end,
+        )
+    except Exception as e:
+        report_redis_error(e)
+        return None
+
+    return result >= 0
+
+
+async def buffered_commit(
+    user_id: int, period_start: datetime, period_end: datetime, token: str
+) -> Optional[int]:
+    """Turn a held unit into a counted one. New count, or None → Redis unavailable."""
+    redis = get_redis()
+    if redis is None:
+        return None
+
+    key = _usage_key(user_id, period_start, period_end)
+    args = [token, settings.usage_buffer_key_ttl_seconds]
+
+    try:
+        return await _run_seeded(
+            redis, COMMIT_LUA, [key, _reservations_key(key), DIRTY_KEY], args,
+            user_id, period_start, period_end,
+        )
+    except Exception as e:
+        report_redis_error(e)
+        return None
+
+
+async def buffered_release(
+    user_id: int, period_start: datetime, period_end: datetime, token: str
+) -> None:
+    """Give the unit back. On failure it expires with the reservation."""
+    redis = get_redis()
+    if redis is None:
+        return
+
+    key = _usage_key(user_id, period_start, period_end)
+    try:
+        await redis.zrem(_reservations_key(key), token)
+    except Exception as e:
+        report_redis_error(e)
+
+
+async def buffered_usage(
+    user_id: int, period_start: datetime, period_end: datetime
+) -> Optional[int]:
+    """Count including unflushed increments, or None if not buffered."""
+    redis = get_redis()
+    if redis is None:
+        return None
+
+    try:
+        used = await redis.hget(_usage_key(user_id, period_start, period_end), "used")
+    except Exception as e:
+        report_redis_error(e)
+        return None
+
+    return int(used) if used is not None else None
+
+
+# -------------------------
+# Postgres fallback reconciliation
+# -------------------------
+# usage hash key -> start times of increments counted in Postgres but
+# possibly not in the hash
+_fallback_increments: Dict[str, List[float]] = {}
+
+
+def note_fallback_increment(
+    user_id: int, period_start: datetime, period_end: datetime, counted_at: float
+) -> None:
+    """
+    An increment went to Postgres because Redis was unavailable.
+    counted_at is time.time() from before the Postgres write.
+    """
+    key = _usage_key(user_id, period_start, period_end)
+    _fallback_increments.setdefault(key, []).append(counted_at)
+
+
+async def reconcile_fallback_increments() -> None:
+    """Add fallback increments to their Redis hashes (flusher, once Redis is back)."""
+    if not _fallback_increments:
+        return
+
+    redis = get_redis()
+    if redis is None:
+        return
+
+    adjust = _script(redis, ADJUST_LUA)
+    for key in list(_fallback_increments):
+        counted = list(_fallback_increments[key])
+        try:
+            await adjust(keys=[key], args=counted)
+        except Exception as e:
+            report_redis_error(e)
+            return
+        # Only what was applied; more may have arrived meanwhile
+        remaining = _fallback_increments.pop(key, [])[len(counted):]
+        if remaining:
+            _fallback_increments[key] = remaining
+
+
+# -------------------------
+# Flusher
+# -------------------------
+class _Claim(NamedTuple):
+    key: str
+    delta: int
+    seq: int
+    user_id: int
+    period_start: datetime
+    period_end: datetime
+
+
+def _parse_claims(flat: List) -> List[_Claim]:
+    return [
+        _Claim(
+            key=flat[i],
+            delta=int(flat[i + 1]),
+            seq=int(flat[i + 2]),
+            user_id=int(flat[i + 3]),
+            period_start=datetime.fromisoformat(flat[i + 4]),
+            period_end=datetime.fromisoformat(flat[i + 5]),
+        )
+        for i in range(0, len(flat), 6)
+    ]
+
+
+async def _apply(claims: List[_Claim]) -> None:
+    stmt = pg_insert(Usage).values(
+        [
+            {
+                "user_id": c.user_id,
+                "period_start": c.period_start,
+                "period_end": c.period_end,
+                "optimizations_used": c.delta,
+                "flush_seq": c.seq,
+            }
+            for c in claims
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_usage_user_period",
+        set_={
+            "optimizations_used": (
+                func.coalesce(Usage.optimizations_used, 0)
+                + stmt.excluded.optimizations_used
+            ),
+            "flush_seq": stmt.excluded.flush_seq,
+            "updated_at": func.now(),
+        },
+        # Already applied (replay after a crash) → skip
+        where=Usage.flush_seq < stmt.excluded.flush_seq,
+    )
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+async def flush_usage() -> int:
+    """Write one batch of buffered increments to Postgres. Returns keys flushed."""
+    redis = get_redis()
+    if redis is None:
+        return 0
+
+    try:
+        flat = await _script(redis, CLAIM_LUA)(
+            keys=[DIRTY_KEY], args=[settings.usage_flush_batch_size]
+        )
+    except Exception as e:
+        report_redis_error(e)
+        return 0
+
+    claims = _parse_claims(flat)
+    if not claims:
+        return 0
+
+    # Failure here leaves the claims inflight; the next flush retries
+    # them with the same seq.
+    await _apply(claims)
+
+    ack_args = []
+    for c in claims:
+        ack_args += [c.key, c.seq]
+    try:
+        await _script(redis, ACK_LUA)(keys=[DIRTY_KEY], args=ack_args)
+    except Exception as e:
+        report_redis_error(e)
+
+    return len(claims)
+
+
+async def run_usage_flusher() -> None:
+    """Periodic flush; started from the app lifespan."""
+    if not settings.usage_buffer_enabled:
+        return
+
+    while True:
+        try:
+            await reconcile_fallback_increments()
+            flushed = await flush_usage()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("⚠️ Usage flush failed:", str(e))
+            flushed = 0
+
+        # Full batch → more waiting, go again right away
+        if flushed < settings.usage_flush_batch_size:
+            await asyncio.sleep(settings.usage_flush_interval_seconds)
+
+
+async def drain_usage() -> None:
+    """Flush everything buffered (shutdown). Leftovers wait for the next start."""
+    try:
+        await reconcile_fallback_increments()
+        while await flush_usage() >= settings.usage_flush_batch_size:
+            pass
+    except Exception as e:
+        print("⚠️ Usage flush on shutdown failed:", str(e))
@@ -1,11 +1,18 @@
 import stripe
-from datetime import datetime
+from datetime import datetime, timezone
 from fastapi import APIRouter, Request, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 
 from app.config import get_settings
-from app.db import SessionLocal
+from app.db import AsyncSessionLocal
 from app.model.user import User
 from app.model.subscription import Subscription
+from app.auth.principal_cache import invalidate_principal
+from app.plan_cache import invalidate_plan
+from app.subscription_cache import invalidate_subscription_me
+from app.auth.entitlements import revoke_entitlements
+from app.db_routing import note_user_write
 
 settings = get_settings()
 
@@ -42,9 +49,9 @@ async def stripe_webhook(request: Request):
             detail="Webhook error",
         )
 
-    db = SessionLocal()
+    affected_user_id = None
 
-    try:
+    async with AsyncSessionLocal() as db:
         # ----------------------------
         # Checkout completed (new sub)
         # ----------------------------
@@ -54,20 +61,26 @@ async def stripe_webhook(request: Request):
             if session["mode"] != "subscription":
                 return {"status": "ignored"}
 
-            user = (
-                db.query(User)
-                .filter(User.stripe_customer_id == session["customer"])
-                .first()
+            user = await db.scalar(
+                select(User).where(
+                    User.stripe_customer_id == session["customer"]
+                )
             )
 
             if not user:
                 return {"status": "user_not_found"}
 
-            stripe_sub = stripe.Subscription.retrieve(
-                session["subscription"]
+            # End the read transaction so the Stripe call doesn't hold
+            # a pooled connection
+            await db.commit()
+
+            stripe_sub = await run_in_threadpool(
+                stripe.Subscription.retrieve,
+                session["subscription"],
             )
 
-            _upsert_subscription(db, user.id, stripe_sub)
+            await _upsert_subscription(db, user.id, stripe_sub)
+            affected_user_id = user.id
 
         # ------------------------------------
         # Subscription updated / renewed
@@ -75,14 +88,15 @@ async def stripe_webhook(request: Request):
         elif event["type"] == "customer.subscription.updated":
             stripe_sub = event["data"]["object"]
 
-            user = (
-                db.query(User)
-                .filter(User.stripe_customer_id == stripe_sub["customer"])
-                .first()
+            user = await db.scalar(
+                select(User).where(
+                    User.stripe_customer_id == stripe_sub["customer"]
+                )
             )
 
             if user:
-                _upsert_subscription(db, user.id, stripe_sub)
+                await _upsert_subscription(db, user.id, stripe_sub)
+                affected_user_id = user.id
 
         # ----------------------------
         # Subscription cancelled
@@ -90,17 +104,16 @@ async def stripe_webhook(request: Request):
         elif event["type"] == "customer.subscription.deleted":
             stripe_sub = event["data"]["object"]
 
-            sub = (
-                db.query(Subscription)
-                .filter(
+            sub = await db.scalar(
+                select(Subscription).where(
                     Subscription.stripe_subscription_id == stripe_sub["id"]
                 )
-                .first()
             )
 
             if sub:
                 sub.status = "canceled"
-                db.commit()
+                await db.commit()
+                affected_user_id = sub.user_id
 
         # ----------------------------
         # Payment failed (optional)
@@ -110,37 +123,45 @@ async def stripe_webhook(request: Request):
             stripe_sub_id = invoice.get("subscription")
 
             if stripe_sub_id:
-                sub = (
-                    db.query(Subscription)
-                    .filter(
+                sub = await db.scalar(
+                    select(Subscription).where(
                         Subscription.stripe_subscription_id
                         == stripe_sub_id
                     )
-                    .first()
                 )
 
                 if sub:
                     sub.status = "past_due"
-                    db.commit()
+                    await db.commit()
+                    affected_user_id = sub.user_id
 
-    finally:
-        db.close()
+    # Cached principal / plan must not outlive a subscription change
+    if affected_user_id is not None:
+        await _invalidate_user_caches(affected_user_id)
 
     return {"status": "success"}
 
 
+async def _invalidate_user_caches(user_id: int) -> None:
+    # Reload from the primary until the change reaches the replica
+    await note_user_write(user_id)
+    await invalidate_principal(user_id)
+    await invalidate_plan(user_id)
+    await invalidate_subscription_me(user_id)
+    # Plan may have changed → tokens must stop vouching for the old one
+    await revoke_entitlements(user_id)
+
+
 # ------------------------------------------------
 # Helper: create or update subscription record
 # ------------------------------------------------
-def _upsert_subscription(db, user_id: int, stripe_sub):
+async def _upsert_subscription(db, user_id: int, stripe_sub):
     price = stripe_sub["items"]["data"][0]["price"]
 
-    sub = (
-        db.query(Subscription)
-        .filter(
+    sub = await db.scalar(
+        select(Subscription).where(
             Subscription.stripe_subscription_id == stripe_sub["id"]
         )
-        .first()
     )
 
     if not sub:
@@ -151,14 +172,15 @@ def _upsert_subscription(db, user_id: int, stripe_sub):
         )
         db.add(sub)
 
-    sub.stripe.price_id = price["id"]
+    sub.stripe_price_id = price["id"]
     sub.status = stripe_sub["status"]
-    sub.current_period_start = datetime.utcfromtimestamp(
-        stripe_sub["current_period_start"]
+    # asyncpg needs aware datetimes for timestamptz columns
+    sub.current_period_start = datetime.fromtimestamp(
+        stripe_sub["current_period_start"], tz=timezone.utc
     )
-    sub.current_period_end = datetime.utcfromtimestamp(
-        stripe_sub["current_period_end"]
+    sub.current_period_end = datetime.fromtimestamp(
+        stripe_sub["current_period_end"], tz=timezone.utc
     )
     sub.cancel_at_period_end = stripe_sub["cancel_at_period_end"]
 
-    db.commit()
\ No newline at end of file
+    await db.commit()
@@ -0,0 +1,87 @@
+"""
+Compare cache codecs on a prompt 1 output.
+
+Usage:
+    python -m scripts.bench_cache_codecs [--iterations 2000] [--fixture PATH]
+
+The default fixture (scripts/fixtures/prompt1_output.json) is a
+representative analysis in the model's output format; pass --fixture
+with a captured output ({"raw_analysis", "product_info"}) to measure
+real traffic. Prints per serializer/compression pair:
+
+    bytes     Redis wire size (what L2 stores)
+    L1 bytes  in-process size of the decoded entry (what L1 holds and
+              counts against memory_cache_max_bytes) — the same for
+              every codec, since L1 keeps the decoded value
+
+Pairs whose optional package is missing are skipped.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from app.cache import _compact
+from app.cache_codecs import COMPRESSORS, SERIALIZERS, Codec
+from app.memory_cache import LRUCache
+
+DEFAULT_FIXTURE = Path(__file__).parent / "fixtures" / "prompt1_output.json"
+
+
+def _load_output(path: Path) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _bench(codec: Codec, payload: dict, iterations: int) -> tuple[int, float, float]:
+    encoded = codec.encode(payload)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(payload)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(encoded)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    return len(encoded), encode_us, decode_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--fixture", type=Path, default=DEFAULT_FIXTURE)
+    args = parser.parse_args()
+
+    output = _load_output(args.fixture)
+    # What TieredCache stores: the compacted output in a {"t", "v"} envelope
+    envelope = {"t": time.time(), "v": _compact(output)}
+
+    # What cache_prompt1_output used to store: json.dumps with product_info
+    legacy = json.dumps(output)
+    print(f"fixture: {args.fixture}")
+    print(f"legacy json.dumps (with product_info): {len(legacy)} bytes\n")
+
+    print(
+        f"{'codec':<18}{'bytes':>8}{'ratio':>8}{'L1 bytes':>10}"
+        f"{'encode µs':>12}{'decode µs':>12}"
+    )
+    for serializer in SERIALIZERS:
+        for compression in COMPRESSORS:
+            codec = Codec(serializer, compression, compress_min_bytes=0)
+            size, enc, dec = _bench(codec, envelope, args.iterations)
+
+            # L1 entry as TieredCache.get_entry builds it after an L2 hit
+            decoded = codec.decode(codec.encode(envelope))
+            l1_bytes = LRUCache._sizeof((decoded["t"], decoded["v"]))
+
+            print(
+                f"{codec.name:<18}{size:>8}{size / len(legacy):>8.2f}"
+                f"{l1_bytes:>10}{enc:>12.1f}{dec:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
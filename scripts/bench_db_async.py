@@ -0,0 +1,94 @@
+"""
+Sync (psycopg2 + threadpool) vs. async (asyncpg) database path.
+
+Usage (against the database in DATABASE_URL, with an existing user):
+    python -m scripts.bench_db_async --user-id 1 \\
+        [--requests 2000] [--concurrency 50]
+
+Runs the principal lookup that get_current_user does on a cache miss
+(user + selectin-loaded subscriptions), `--requests` times at
+`--concurrency`, once per path:
+
+  sync   SessionLocal inside run_in_threadpool (the old dependency)
+  async  AsyncSessionLocal awaited on the event loop
+
+Prints requests/s and p50/p99 latency for each.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.db import AsyncSessionLocal, SessionLocal, async_engine, engine
+from app.model.user import User
+from app.model.subscription import Subscription  # noqa: F401 (mapper)
+
+
+def _load_sync(user_id: int) -> None:
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        list(user.subscriptions)
+    finally:
+        db.close()
+
+
+async def _sync_path(user_id: int) -> None:
+    await run_in_threadpool(_load_sync, user_id)
+
+
+async def _async_path(user_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        list(user.subscriptions)
+
+
+def _pct(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * pct) - 1, 0)] * 1e3
+
+
+async def _run(name: str, fn, user_id: int, requests: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one() -> None:
+        async with sem:
+            start = time.perf_counter()
+            await fn(user_id)
+            latencies.append(time.perf_counter() - start)
+
+    # Warm the pool first
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    latencies.clear()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{name:>5}: {requests / elapsed:8.0f} req/s  "
+        f"p50 {statistics.median(latencies) * 1e3:6.1f} ms  "
+        f"p99 {_pct(latencies, 0.99):6.1f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        await _run("sync", _sync_path, args.user_id, args.requests, args.concurrency)
+        await _run("async", _async_path, args.user_id, args.requests, args.concurrency)
+    finally:
+        engine.dispose()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""
+Benchmark the in-process GCRA rate limiter.
+
+Usage:
+    python -m scripts.bench_gcra [--users 100000] [--checks 1000000]
+
+Reports checks per second on a hot key set and memory per tracked user.
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.gcra import GCRALimiter
+
+
+def _checks_per_second(checks: int, users: int) -> float:
+    limiter = GCRALimiter(max_keys=users * 2)
+    keys = [f"user-{i}" for i in range(users)]
+
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.hit(keys[i % users], limit=10, window_seconds=3600)
+    return checks / (time.perf_counter() - start)
+
+
+def _bytes_per_user(users: int) -> float:
+    keys = [f"{i:08d}" for i in range(users)]  # built before tracing
+
+    tracemalloc.start()
+    limiter = GCRALimiter(max_keys=users * 2)
+    before = tracemalloc.get_traced_memory()[0]
+    for key in keys:
+        limiter.hit(key, limit=10, window_seconds=3600)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / users
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    hot = _checks_per_second(args.checks, 1000)
+    wide = _checks_per_second(args.checks, args.users)
+    per_user = _bytes_per_user(args.users)
+
+    print(f"checks/s (1k hot users): {hot:,.0f}")
+    print(f"checks/s ({args.users:,} users): {wide:,.0f}")
+    print(f"memory per tracked user: {per_user:.0f} bytes (excluding key string)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Login storm vs. latency of other endpoints.
+
+Usage (against a running server with an existing account):
+    python -m scripts.bench_login_storm \\
+        --base-url http://localhost:8000 \\
+        --email bench@example.com --password secret \\
+        --logins 200 --concurrency 50 [--probe-path /users/me]
+
+Fires `--logins` logins at `--concurrency`, while a probe loop calls
+`--probe-path` with a valid token. Prints logins/s and p50/p99 of the
+probe during the storm, next to a quiet baseline.
+
+The default probe, /users/me, goes through the shared threadpool:
+FastAPI runs its sync dependency get_token_payload there, so it queues
+behind anything else holding the pool's threads. Compare two server
+runs:
+
+    PASSWORD_HASH_EXECUTOR=process   bcrypt on the dedicated process pool
+    PASSWORD_HASH_EXECUTOR=thread    bcrypt on the shared threadpool
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def _pct(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * pct) - 1, 0)] * 1e3
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    resp = await client.post(
+        "/auth/login", data={"username": email, "password": password}
+    )
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def _probe(
+    client: httpx.AsyncClient, path: str, token: str, stop: asyncio.Event
+) -> list[float]:
+    latencies: list[float] = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-path", default="/users/me")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await _login(client, args.email, args.password)
+
+        # Baseline: probe alone for 2s
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, args.probe_path, token, stop))
+        await asyncio.sleep(2)
+        stop.set()
+        baseline = await probe
+
+        # Storm
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, args.probe_path, token, stop))
+        sem = asyncio.Semaphore(args.concurrency)
+        failures = 0
+
+        async def one() -> None:
+            nonlocal failures
+            async with sem:
+                try:
+                    await _login(client, args.email, args.password)
+                except httpx.HTTPError:
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        during = await probe
+
+    print(
+        f"logins: {args.logins} in {elapsed:.1f}s → "
+        f"{args.logins / elapsed:.1f}/s ({failures} failed)"
+    )
+    print(
+        f"{args.probe_path} baseline: p50 {statistics.median(baseline) * 1e3:.1f} ms, "
+        f"p99 {_pct(baseline, 0.99):.1f} ms"
+    )
+    print(
+        f"{args.probe_path} during storm: p50 {statistics.median(during) * 1e3:.1f} ms, "
+        f"p99 {_pct(during, 0.99):.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Benchmark and concurrency check for the Redis rate limiter.
+
+Usage:
+    # in-process stand-in (fakeredis with Lua support, no server needed)
+    python -m scripts.bench_rate_limiter --fakeredis
+
+    # real Redis, e.g. `docker run -p 6379:6379 redis`
+    REDIS_URL=redis://localhost:6379/15 python -m scripts.bench_rate_limiter
+
+1. Concurrency: fires `--burst` simultaneous checks at one key with a
+   limit of `--limit`; exactly `--limit` must be admitted.
+2. Throughput: sequential and concurrent checks per second plus p50/p99
+   latency against distinct keys.
+
+Uses a dedicated DB index; keys are prefixed and deleted afterwards.
+fakeredis (`pip install fakeredis lupa`) checks the Lua logic and
+atomicity; its latency numbers say nothing about a networked Redis.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from app import redis_client
+from app.config import get_settings
+from app.rate_limiter import check_rate_limit
+from app.redis_client import close_redis, get_redis, init_redis
+
+settings = get_settings()
+
+
+def _use_fakeredis() -> None:
+    """
+    Point the shared clients at an in-process fakeredis server, behind
+    the same client class and blocking pool settings as init_redis().
+    """
+    import fakeredis
+    import redis.asyncio as aioredis
+
+    server = fakeredis.FakeServer()
+    client_class = redis_client._tracked_client_class(aioredis)
+
+    def client(decode_responses: bool):
+        pool = aioredis.BlockingConnectionPool(
+            connection_class=fakeredis.FakeAsyncConnection,
+            server=server,
+            decode_responses=decode_responses,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout_seconds,
+        )
+        return client_class(connection_pool=pool)
+
+    redis_client._redis = client(decode_responses=True)
+    redis_client._redis_binary = client(decode_responses=False)
+    redis_client._healthy = True
+
+
+async def _concurrency_check(limit: int, burst: int) -> bool:
+    user_id = f"bench-{uuid.uuid4().hex}"
+    results = await asyncio.gather(
+        *(
+            check_rate_limit(user_id, max_requests=limit, window_seconds=60)
+            for _ in range(burst)
+        )
+    )
+    admitted = sum(1 for r in results if r.allowed)
+    remaining = sorted(r.remaining for r in results if r.allowed)
+
+    ok = admitted == limit and remaining == list(range(limit))
+    print(
+        f"concurrency: {burst} requests, limit {limit} → "
+        f"admitted {admitted} ({'OK' if ok else 'FAIL'})"
+    )
+    await get_redis().delete(f"rate_limit:{user_id}")
+    return ok
+
+
+async def _throughput(n: int, concurrency: int) -> None:
+    prefix = f"bench-{uuid.uuid4().hex}"
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        start = time.perf_counter()
+        await check_rate_limit(
+            f"{prefix}-{i % 100}", max_requests=10**9, window_seconds=60
+        )
+        latencies.append(time.perf_counter() - start)
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def bounded(i: int) -> None:
+        async with sem:
+            await one(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"throughput (concurrency={concurrency}): {n / elapsed:,.0f} checks/s, "
+        f"p50 {statistics.median(latencies) * 1e3:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e3:.2f} ms"
+    )
+
+    redis = get_redis()
+    await redis.delete(*(f"rate_limit:{prefix}-{i}" for i in range(100)))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--fakeredis", action="store_true")
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        _use_fakeredis()
+    else:
+        await init_redis()
+    if get_redis() is None:
+        raise SystemExit("Redis is not reachable; set REDIS_URL")
+
+    try:
+        ok = await _concurrency_check(args.limit, args.burst)
+        await _throughput(args.requests, concurrency=1)
+        await _throughput(args.requests, concurrency=50)
+    finally:
+        await close_redis()
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
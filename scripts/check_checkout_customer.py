@@ -0,0 +1,119 @@
+"""
+Check the lazy Stripe customer path at checkout.
+
+Usage (migrated Postgres in DATABASE_URL, a Stripe *test* key in
+STRIPE_SECRET_KEY):
+    python -m scripts.check_checkout_customer
+
+Runs the app in-process (no lifespan, so the outbox worker can't create
+the customer first):
+
+1. registers a throwaway user → no stripe_customer_id, outbox pending;
+2. POST /billing/checkout → ensure_stripe_customer creates the customer
+   and stores it on the user, and the outbox event is marked done;
+3. repeats Customer.create with the same idempotency key and parameters
+   (what a racing outbox worker would send) → Stripe returns the same
+   customer instead of a second one.
+
+The Checkout Session itself needs the hard-coded price to exist in the
+Stripe account; if it doesn't, step 2 returns 500 after the customer was
+stored, and the customer checks still apply.
+"""
+import asyncio
+import sys
+import uuid
+
+import httpx
+import stripe
+from sqlalchemy import delete, select
+
+from app.config import get_settings
+from app.db import AsyncSessionLocal, async_engine
+from app.main import app
+from app.model.outbox import OutboxEvent
+from app.model.user import User
+from app.services.stripe_customer_service import (
+    CUSTOMER_CREATE_EVENT,
+    _create_customer,
+    _idempotency_key,
+)
+
+settings = get_settings()
+
+
+async def _user_state(email: str) -> tuple[User, str]:
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.email == email))
+        status = await db.scalar(
+            select(OutboxEvent.status).where(
+                OutboxEvent.user_id == user.id,
+                OutboxEvent.event_type == CUSTOMER_CREATE_EVENT,
+            )
+        )
+    return user, status
+
+
+async def main() -> None:
+    if not (settings.stripe_secret_key or "").startswith("sk_test_"):
+        raise SystemExit("Set STRIPE_SECRET_KEY to a Stripe test key")
+
+    email = f"checkout-{uuid.uuid4().hex[:8]}@example.com"
+    password = uuid.uuid4().hex
+    failures = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        resp = await client.post(
+            "/auth/register", json={"email": email, "password": password}
+        )
+        resp.raise_for_status()
+
+        user, status = await _user_state(email)
+        print(
+            f"registered user {user.id}: "
+            f"customer={user.stripe_customer_id}, outbox={status}"
+        )
+        if user.stripe_customer_id is not None or status != "pending":
+            failures.append("fresh user should have no customer and a pending event")
+
+        resp = await client.post(
+            "/auth/login", data={"username": email, "password": password}
+        )
+        resp.raise_for_status()
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        resp = await client.post("/billing/checkout", headers=headers)
+        print(f"POST /billing/checkout → {resp.status_code}")
+
+    user, status = await _user_state(email)
+    customer_id = user.stripe_customer_id
+    print(f"after checkout: customer={customer_id}, outbox={status}")
+    if customer_id is None or status != "done":
+        failures.append("checkout should store the customer and close the outbox event")
+    else:
+        # What a racing outbox worker sends: same key, same parameters
+        replayed = _create_customer(user.id, user.email)
+        print(f"replay with key {_idempotency_key(user.id)} → {replayed}")
+        if replayed != customer_id:
+            failures.append("idempotency key returned a different customer")
+
+        customer = stripe.Customer.retrieve(customer_id)
+        if customer.metadata.get("user_id") != str(user.id):
+            failures.append("customer metadata.user_id mismatch")
+        stripe.Customer.delete(customer_id)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(OutboxEvent).where(OutboxEvent.user_id == user.id))
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
+    await async_engine.dispose()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
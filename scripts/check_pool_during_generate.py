@@ -0,0 +1,110 @@
+"""
+Check that generations don't hold database connections.
+
+Usage (against a running server):
+    python -m scripts.check_pool_during_generate \\
+        --base-url http://localhost:8000 \\
+        --product-url https://example.com/products/x --concurrency 15
+
+Registers `--concurrency` throwaway free-plan users (bench-<run>-<n>@
+example.com) and starts one /api/generate call per user at once, so
+the per-user concurrency cap (max_concurrent_generations: 1 on free)
+and per-user rate limit don't turn the run into a wall of 429s. Keep
+`--concurrency` at or below the free tier's tier_concurrent_generations
+(20) for the same reason.
+
+Samples `database_pool` from /health while the calls run. With
+connections released before the LLM chain, checked_out stays near zero
+however many generations are in flight, and max_hold_ms stays far below
+a generation's duration.
+"""
+import argparse
+import asyncio
+import uuid
+
+import httpx
+
+FREE_TIER_CONCURRENCY = 20
+
+
+async def _sample(
+    client: httpx.AsyncClient, stop: asyncio.Event
+) -> tuple[int, dict]:
+    peak, pool = 0, {}
+    while not stop.is_set():
+        resp = await client.get("/health")
+        pool = resp.json().get("database_pool", {})
+        peak = max(peak, sum(p["checked_out"] for p in pool.values()))
+        await asyncio.sleep(0.2)
+    return peak, pool
+
+
+async def _seed_user(client: httpx.AsyncClient, email: str, password: str) -> dict:
+    """Register + login one bench user; returns auth headers."""
+    resp = await client.post(
+        "/auth/register", json={"email": email, "password": password}
+    )
+    resp.raise_for_status()
+
+    resp = await client.post(
+        "/auth/login", data={"username": email, "password": password}
+    )
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--product-url", required=True)
+    parser.add_argument("--concurrency", type=int, default=15)
+    args = parser.parse_args()
+
+    if args.concurrency > FREE_TIER_CONCURRENCY:
+        print(
+            f"⚠️ --concurrency {args.concurrency} exceeds the free tier's "
+            f"{FREE_TIER_CONCURRENCY} concurrent generations; expect 429s"
+        )
+
+    run = uuid.uuid4().hex[:8]
+    password = uuid.uuid4().hex
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300) as client:
+        # Sequential: registration/login are bcrypt-bound, not what's measured
+        users = []
+        for n in range(args.concurrency):
+            users.append(
+                await _seed_user(client, f"bench-{run}-{n}@example.com", password)
+            )
+
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample(client, stop))
+
+        results = await asyncio.gather(
+            *(
+                client.post(
+                    "/api/generate",
+                    json={"product_info": args.product_url},
+                    headers=headers,
+                )
+                for headers in users
+            ),
+            return_exceptions=True,
+        )
+        stop.set()
+        peak, pool = await sampler
+
+    statuses = [
+        r.status_code if isinstance(r, httpx.Response) else type(r).__name__
+        for r in results
+    ]
+    print(f"generations: {args.concurrency} users × 1 → {statuses}")
+    if any(s == 429 for s in statuses):
+        print("⚠️ Some calls were throttled; the pool numbers cover fewer generations")
+    print(f"peak connections checked out during generation: {peak}")
+    for name, stats in pool.items():
+        print(f"  {name}: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,232 @@
+"""
+Assert that the hot-path queries use their indexes.
+
+Usage (against a migrated Postgres database in DATABASE_URL):
+    python -m scripts.check_query_plans [--users 20000]
+
+Seeds `--users` users with subscriptions, usage rows and outbox events
+inside a transaction, ANALYZEs, EXPLAINs each hot query and checks the
+plan scans the expected indexes. Everything is rolled back afterwards.
+Exits non-zero if any query misses an index.
+
+The subscription and usage queries are the app's own: the SQL the ORM
+emits for the principal's selectin-loaded subscriptions (captured while
+loading a user), and the statements /subscription/me builds.
+"""
+import argparse
+import json
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.api.subscription import _free_usage_query, _subscription_query
+from app.db import engine
+from app.model.user import User
+from app.services.usage_service import usage_period
+
+SEED = [
+    # users
+    """
+    INSERT INTO users (email, hashed_password, stripe_customer_id, is_active, is_pro)
+    SELECT 'plan-check-' || g || '@example.com', 'x', 'cus_plancheck_' || g, true, false
+    FROM generate_series(1, :users) g
+    """,
+    # ~2 subscriptions per user; a quarter active
+    """
+    INSERT INTO subscriptions (
+        user_id, stripe_subscription_id, stripe_price_id, stripe_customer_id,
+        status, current_period_start, current_period_end,
+        cancel_at_period_end, created_at, updated_at
+    )
+    SELECT u.id,
+           'sub_plancheck_' || u.id || '_' || n,
+           'price_starter_monthly',
+           u.stripe_customer_id,
+           CASE WHEN n = 1 AND u.id % 4 = 0 THEN 'active' ELSE 'canceled' END,
+           now() - interval '10 days',
+           now() + interval '20 days',
+           false,
+           now() - (n || ' days')::interval,
+           now()
+    FROM users u, generate_series(1, 2) n
+    WHERE u.email LIKE 'plan-check-%'
+    """,
+    # 12 billing periods of usage per user
+    """
+    INSERT INTO usage (user_id, optimizations_used, period_start, period_end)
+    SELECT u.id, 1,
+           date_trunc('month', now()) - (m || ' months')::interval,
+           date_trunc('month', now()) - ((m - 1) || ' months')::interval
+    FROM users u, generate_series(0, 11) m
+    WHERE u.email LIKE 'plan-check-%'
+    """,
+    # outbox: mostly processed
+    """
+    INSERT INTO outbox_events (user_id, event_type, payload, status, attempts, next_attempt_at, created_at)
+    SELECT u.id, 'stripe.customer.create', '{}',
+           CASE WHEN u.id % 100 = 0 THEN 'pending' ELSE 'done' END,
+           0, now(), now()
+    FROM users u
+    WHERE u.email LIKE 'plan-check-%'
+    """,
+    "ANALYZE users, subscriptions, usage, outbox_events",
+]
+
+# (name, SQL, expected index)
+TEXT_CHECKS = [
+    (
+        "principal by id",
+        "SELECT * FROM users WHERE id = :user_id",
+        "users_pkey",
+    ),
+    (
+        "login by email",
+        "SELECT * FROM users WHERE email = :email",
+        "ix_users_email",
+    ),
+    (
+        "webhook user by customer",
+        "SELECT * FROM users WHERE stripe_customer_id = :customer",
+        "ix_users_stripe_customer_id",
+    ),
+    (
+        "outbox due events",
+        """
+        SELECT * FROM outbox_events
+        WHERE event_type = 'stripe.customer.create'
+          AND status = 'pending'
+          AND next_attempt_at <= now()
+        ORDER BY id
+        LIMIT 20
+        """,
+        "ix_outbox_events_status_due",
+    ),
+]
+
+
+def _sent(conn, run, table: str) -> Tuple[str, dict]:
+    """Driver-level SQL and parameters of the first query `run` sends on `table`."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if f"FROM {table}" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+
+    return captured[0]
+
+
+def _load_principal(conn, user_id: int) -> None:
+    # The subscriptions are selectin-loaded by this get
+    with Session(bind=conn) as db:
+        db.get(User, user_id)
+
+
+def _app_checks(conn, user_id: int) -> List[Tuple[str, str, dict, Tuple[str, ...]]]:
+    """(name, driver SQL, driver params, expected indexes)"""
+    free_period = usage_period(None, None)
+    return [
+        (
+            "principal subscriptions (selectin)",
+            *_sent(conn, lambda: _load_principal(conn, user_id), "subscriptions"),
+            ("ix_subscriptions_user_status_created",),
+        ),
+        (
+            "subscription/me latest + usage",
+            *_sent(
+                conn,
+                lambda: conn.execute(_subscription_query(user_id)),
+                "subscriptions",
+            ),
+            ("ix_subscriptions_user_status_created", "uq_usage_user_period"),
+        ),
+        (
+            "subscription/me free usage",
+            *_sent(
+                conn,
+                lambda: conn.execute(_free_usage_query(user_id, *free_period)),
+                "usage",
+            ),
+            ("uq_usage_user_period",),
+        ),
+    ]
+
+
+def _indexes_used(plan: dict) -> set[str]:
+    found = set()
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= _indexes_used(child)
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = 0
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            for statement in SEED:
+                conn.execute(text(statement), {"users": args.users})
+
+            sample = conn.execute(
+                text(
+                    "SELECT id, email, stripe_customer_id FROM users "
+                    "WHERE email LIKE 'plan-check-%' AND id % 4 = 0 LIMIT 1"
+                )
+            ).one()
+            params = {
+                "user_id": sample.id,
+                "email": sample.email,
+                "customer": sample.stripe_customer_id,
+            }
+
+            explained = [
+                (
+                    name,
+                    conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar(),
+                    (expected,),
+                )
+                for name, sql, expected in TEXT_CHECKS
+            ] + [
+                (
+                    name,
+                    conn.exec_driver_sql(
+                        f"EXPLAIN (FORMAT JSON) {sql}", driver_params
+                    ).scalar(),
+                    expected,
+                )
+                for name, sql, driver_params, expected in _app_checks(conn, sample.id)
+            ]
+
+            for name, raw, expected in explained:
+                plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+                used = _indexes_used(plan)
+
+                missing = sorted(set(expected) - used)
+                failures += bool(missing)
+                print(
+                    f"{'❌' if missing else '✅'} {name}: "
+                    f"{plan['Node Type']} using {sorted(used) or 'no index'}"
+                    f"{f' (expected {missing})' if missing else ''}"
+                )
+        finally:
+            trans.rollback()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Concurrent-load check for usage metering (no lost updates).
+
+Usage (against a migrated Postgres database in DATABASE_URL):
+    python -m scripts.check_usage_metering [--requests 500] [--limit 300] \\
+        [--concurrency 50]
+
+Creates a throwaway user and fires `--requests` concurrent
+reserve_quota + commit_quota pairs (the Postgres metering path behind
+/optimize, each on its own session) against a plan limit of `--limit`.
+Checks that exactly min(requests, limit) reservations succeeded, the
+rest were refused, and the stored count equals the number of commits.
+Then repeats with an unlimited plan, where the stored count must equal
+`--requests`. The user and its usage and reservation rows are deleted
+at the end.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+
+from app.db import AsyncSessionLocal, async_engine
+from app.model.usage import Usage, UsageReservation
+from app.model.user import User
+from app.services.quota_service import commit_quota, reserve_quota
+
+
+async def _hammer(
+    user_id: int, limit, requests: int, concurrency: int, period
+) -> tuple[int, int, int, float]:
+    sem = asyncio.Semaphore(concurrency)
+    ok = refused = 0
+
+    async def one() -> None:
+        nonlocal ok, refused
+        async with sem, AsyncSessionLocal() as db:
+            try:
+                reservation = await reserve_quota(db, user_id, limit, *period)
+            except HTTPException:
+                refused += 1
+                return
+            await commit_quota(db, reservation)
+            ok += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    async with AsyncSessionLocal() as db:
+        stored = await db.scalar(
+            select(Usage.optimizations_used).where(
+                Usage.user_id == user_id,
+                Usage.period_start == period[0],
+                Usage.period_end == period[1],
+            )
+        )
+    return ok, refused, stored or 0, elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        user = User(
+            email=f"metering-check-{uuid.uuid4().hex}@example.com",
+            hashed_password="x",
+        )
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    failures = 0
+
+    try:
+        cases = [
+            ("limited", args.limit, min(args.requests, args.limit)),
+            ("unlimited", "unlimited", args.requests),
+        ]
+        for i, (name, limit, expected) in enumerate(cases):
+            # separate billing period per case
+            period = (now + timedelta(days=31 * i), now + timedelta(days=31 * (i + 1)))
+            ok, refused, stored, elapsed = await _hammer(
+                user_id, limit, args.requests, args.concurrency, period
+            )
+            passed = ok == expected and stored == expected
+            failures += not passed
+            print(
+                f"{'✅' if passed else '❌'} {name}: {ok} ok, {refused} refused, "
+                f"stored {stored} (expected {expected}) "
+                f"in {elapsed:.2f}s → {args.requests / elapsed:.0f} req/s"
+            )
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(UsageReservation).where(UsageReservation.user_id == user_id)
+            )
+            await db.execute(delete(Usage).where(Usage.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+        await async_engine.dispose()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())